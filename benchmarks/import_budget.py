@@ -0,0 +1,82 @@
+# Checks that the entry point stays cheap to import, using `python -X importtime`.
+# Usage: python benchmarks/import_budget.py [--runs 5]
+from __future__ import annotations
+
+import argparse
+import os
+import subprocess
+import sys
+
+SOURCE_DIR = os.path.join(os.path.dirname(__file__), "..", "fps_bypass")
+
+# Cumulative import times in milliseconds. `main` must only import what it needs
+# to parse arguments, and the plain text path must do without rich.
+BUDGETS = {
+    "main": (10.0, ("rich", "winapi", "asyncio", "genshin")),
+    "ui, app": (250.0, ("rich",)),
+}
+
+
+def measure_import(statement: str) -> tuple[float, set[str]]:
+    """Imports the modules in a fresh interpreter, returning the cumulative
+    import time of the top level ones in milliseconds and every module imported."""
+
+    result = subprocess.run(
+        (sys.executable, "-X", "importtime", "-c", f"import {statement}"),
+        cwd=SOURCE_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    targets = {name.strip() for name in statement.split(",")}
+    cumulative = 0
+    modules = set()
+
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+
+        _, cumulative_us, name = line.split("|")
+        if not cumulative_us.strip().isdigit():
+            continue
+
+        modules.add(name.strip())
+
+        # Top level modules are not indented.
+        if name[1:] in targets:
+            cumulative += int(cumulative_us)
+
+    return cumulative / 1000, modules
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    failed = False
+    for statement, (budget, forbidden) in BUDGETS.items():
+        # The best run is the least affected by noise.
+        measurements = [measure_import(statement) for _ in range(args.runs)]
+        best = min(import_time for import_time, _ in measurements)
+        imported = measurements[0][1]
+
+        leaked = sorted(
+            module for module in imported if module.split(".", 1)[0] in forbidden
+        )
+        ok = best <= budget and not leaked
+        failed |= not ok
+
+        print(
+            f"{'OK' if ok else 'FAIL':>4} import {statement}: {best:.2f}ms "
+            f"(budget {budget:.2f}ms)",
+        )
+        if leaked:
+            print(f"     imports {', '.join(leaked)}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
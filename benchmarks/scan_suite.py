@@ -0,0 +1,285 @@
+# Reproducible benchmarks of the signature scanning engines.
+# Usage: python benchmarks/scan_suite.py [--sizes 1 16 128 512] [--output results.json]
+#        python benchmarks/scan_suite.py --anchors common --engines exec numpy
+#        python benchmarks/scan_suite.py --compare old.json new.json
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "fps_bypass"))
+
+import memory
+
+MB = 1024 * 1024
+
+# Shaped like the FPS signature followed by the call displacement and the
+# instruction after it.
+BASE_PATTERN = (0xB9, 0x3C, 0x00, 0x00, 0x00, 0xFF, 0x15, 0x12, 0x34, 0x56, 0x78, 0x48)
+
+# Common: filler made of the signature's own bytes, so the anchor has lots of
+# candidate hits. Rare: filler sharing no bytes with the signature. Code:
+# filler following the byte distribution of x86-64 code, anchor included.
+ANCHORS = {
+    "common": bytes(sorted(set(BASE_PATTERN))),
+    "rare": bytes(sorted(set(range(256)) - set(BASE_PATTERN))),
+    "code": bytes(range(256)),
+}
+ANCHOR_WEIGHTS = {
+    "code": list(memory.X86_64_BYTE_FREQUENCIES),
+}
+
+# Filler which may contain the signature's bytes also gets near misses: the
+# start of the pattern with a wrong byte after it, so that scans reject
+# candidates at varying depths as they would in real code.
+NEAR_MISS_ANCHORS = ("common", "code")
+NEAR_MISS_INTERVAL = 64 * 1024
+
+# Written over the first byte of matches occurring in the filler by chance, so
+# the only match in a buffer is the planted one. Not in the pattern, so this
+# never makes a new match.
+BREAK_BYTE = 0x90
+
+POSITIONS = ("start", "middle", "end", "absent")
+WILDCARD_DENSITIES = (0.0, 0.25, 0.5)
+
+# Buffers are built by repeating a block, as generating 512MB byte by byte
+# would take longer than the benchmarks themselves.
+BLOCK_SIZE = MB
+
+
+def make_signature(density: float) -> memory.Signature:
+    wildcards = round((len(BASE_PATTERN) - 1) * density)
+    # Spread the wildcards evenly over everything but the first byte.
+    step = (len(BASE_PATTERN) - 1) / wildcards if wildcards else 0
+    positions = {1 + int(i * step) for i in range(wildcards)}
+
+    return memory.Signature(
+        *(None if i in positions else byte for i, byte in enumerate(BASE_PATTERN)),
+    )
+
+
+# Near misses go wrong at bytes which are never wildcarded, or they would match.
+NEAR_MISS_DEPTHS = tuple(
+    depth
+    for depth in range(1, len(BASE_PATTERN))
+    if all(
+        make_signature(density).pattern[depth] is not None
+        for density in WILDCARD_DENSITIES
+    )
+)
+
+
+def get_match_offset(size: int, position: str) -> int | None:
+    return {
+        "start": 0,
+        "middle": size // 2,
+        "end": size - len(BASE_PATTERN),
+        "absent": None,
+    }[position]
+
+
+def make_block(size: int, anchor: str) -> bytes:
+    rng = random.Random(anchor)
+    block = bytearray(
+        rng.choices(
+            ANCHORS[anchor],
+            weights=ANCHOR_WEIGHTS.get(anchor),
+            k=size,
+        ),
+    )
+
+    if anchor in NEAR_MISS_ANCHORS:
+        offsets = range(0, size - len(BASE_PATTERN), NEAR_MISS_INTERVAL)
+
+        for i, offset in enumerate(offsets):
+            depth = NEAR_MISS_DEPTHS[i % len(NEAR_MISS_DEPTHS)]
+            block[offset : offset + depth] = bytes(BASE_PATTERN[:depth])
+            block[offset + depth] = BASE_PATTERN[depth] ^ 0xFF
+
+    # Including matches spanning the end of one repeat of the block and the
+    # start of the next.
+    wrapped = bytes(block + block[: len(BASE_PATTERN) - 1])
+    for density in WILDCARD_DENSITIES:
+        for offset in memory.signature_scan_all(wrapped, make_signature(density)):
+            block[offset] = BREAK_BYTE
+
+    return bytes(block)
+
+
+def make_buffer(size: int, anchor: str, position: str) -> bytearray:
+    block = make_block(min(size, BLOCK_SIZE), anchor)
+    buffer = bytearray(block * (size // len(block)))
+
+    match_offset = get_match_offset(size, position)
+    if match_offset is not None:
+        buffer[match_offset : match_offset + len(BASE_PATTERN)] = bytes(BASE_PATTERN)
+
+    return buffer
+
+
+def percentile(samples: list[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def measure(
+    func: memory.SignatureFunction,
+    buffer: bytearray,
+    scanned: int,
+    repeats: int,
+) -> dict:
+    samples = []
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        func(buffer)
+        samples.append(time.perf_counter() - start_time)
+
+    # Measured separately as tracing allocations slows everything down.
+    tracemalloc.start()
+    func(buffer)
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    best = min(samples)
+    return {
+        "mb_per_s": scanned / MB / best if best else float("inf"),
+        "latency": {
+            "min": best,
+            "p50": percentile(samples, 0.5),
+            "p90": percentile(samples, 0.9),
+            "p99": percentile(samples, 0.99),
+        },
+        "peak_memory": peak_memory,
+    }
+
+
+def get_commit() -> str | None:
+    try:
+        return subprocess.check_output(
+            ("git", "rev-parse", "--short", "HEAD"),
+            # The commit of the code benchmarked, wherever it is run from.
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            text=True,
+            stderr=subprocess.DEVNULL,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(
+    sizes: list[int],
+    engines: list[str],
+    anchors: list[str],
+    repeats: int,
+) -> dict:
+    results = []
+
+    for size_mb, anchor, position in itertools.product(sizes, anchors, POSITIONS):
+        buffer = make_buffer(size_mb * MB, anchor, position)
+
+        # Throughput is of the bytes up to the end of the match, as that is all
+        # a first-match scan has to look at.
+        match_offset = get_match_offset(len(buffer), position)
+        scanned = (
+            len(buffer) if match_offset is None else match_offset + len(BASE_PATTERN)
+        )
+
+        for density, engine in itertools.product(WILDCARD_DENSITIES, engines):
+            func = memory.compile_signature(make_signature(density), engine)
+            result = {
+                "engine": engine,
+                "size_mb": size_mb,
+                "anchor": anchor,
+                "position": position,
+                "wildcard_density": density,
+                **measure(func, buffer, scanned, repeats),
+            }
+            results.append(result)
+
+            print(
+                f"{engine:>8} {size_mb:>4}MB {anchor:>6} {position:>6} "
+                f"{density:>4.2f}: {result['mb_per_s']:10.2f} MB/s "
+                f"(p50 {result['latency']['p50'] * 1000:.2f}ms)",
+            )
+
+        del buffer
+
+    return {
+        "commit": get_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeats": repeats,
+        "results": results,
+    }
+
+
+def _case_key(result: dict) -> tuple:
+    return (
+        result["engine"],
+        result["size_mb"],
+        result["anchor"],
+        result["position"],
+        result["wildcard_density"],
+    )
+
+
+def compare(old_path: str, new_path: str) -> None:
+    with open(old_path) as f:
+        old = {_case_key(result): result for result in json.load(f)["results"]}
+
+    with open(new_path) as f:
+        new = json.load(f)["results"]
+
+    for result in new:
+        previous = old.get(_case_key(result))
+        if previous is None:
+            continue
+
+        change = result["mb_per_s"] / previous["mb_per_s"] - 1
+        engine, size_mb, anchor, position, density = _case_key(result)
+        print(
+            f"{engine:>8} {size_mb:>4}MB {anchor:>6} {position:>6} "
+            f"{density:>4.2f}: {change * 100:+7.1f}%",
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 16, 128, 512])
+    parser.add_argument("--engines", nargs="+", default=list(memory.ENGINES))
+    parser.add_argument(
+        "--anchors",
+        nargs="+",
+        choices=list(ANCHORS),
+        default=list(ANCHORS),
+    )
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--output", help="Where to write the results as JSON.")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    if memory.ENGINE_NUMPY in args.engines and not memory._has_numpy():
+        print("NumPy is not installed, so the numpy engine falls back to regex.")
+
+    report = run(args.sizes, args.engines, args.anchors, args.repeats)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,380 @@
+# The bypass itself, run once the entry point has set up the console.
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+from typing import Any
+from typing import Coroutine
+from typing import NamedTuple
+
+import config
+import daemon
+import enforcement
+import genshin
+import metrics
+import supervisor
+import tracing
+import utils
+from ui import UI
+
+logger = logging.getLogger("rich")
+
+# How long each startup stage may take before giving up, in seconds.
+MODULES_TIMEOUT = 120
+POINTERS_TIMEOUT = 120
+GAME_LOAD_TIMEOUT = 600
+
+# Where the startup trace is written to in trace mode.
+TRACE_PATH = "fps_bypass_trace.json"
+
+
+class Options(NamedTuple):
+    # Enforce the FPS of every running instance rather than starting the game.
+    multi: bool = False
+    # Run unattended, controlled over IPC instead of the prompt. Implies `multi`.
+    daemon: bool = False
+    # Serve runtime metrics over HTTP on localhost.
+    metrics: bool = False
+    # Processes to split a full scan across. Only one by default, which streams
+    # the module in chunks rather than reading all of it into memory at once.
+    workers: int = 1
+
+
+@tracing.traced("startup")
+async def setup_config(ui: UI) -> config.Configuration:
+    with ui.progress("[blue]First Time Setup", total=2) as progress:
+        ui.log(":grey_question: Please open Genshin Impact to continue.")
+
+        instance = await utils.wait_for_async(genshin.get_running_game)
+        instance.handle.close()
+
+        ui.log(
+            f":white_check_mark: Found Genshin Impact with PID {instance.id}.",
+        )
+        progress.advance()
+
+        # Create config.
+        game_path = instance.path
+        fps_value = await asyncio.to_thread(utils.get_default_fps)
+
+        logger.debug(f"Game path: {game_path!r}")
+        logger.debug(f"Default FPS: {fps_value}")
+
+        fps_config = config.Configuration(
+            genshin_path=game_path,
+            target_fps=fps_value,
+        )
+
+        config.write_config(fps_config)
+
+        ui.log(
+            f":white_check_mark: Configuration complete!",
+        )
+        progress.advance()
+
+    return fps_config
+
+
+@tracing.traced("startup")
+async def wait_for_game_close(ui: UI) -> None:
+    genshin_info = await asyncio.to_thread(genshin.get_running_game)
+
+    if not genshin_info:
+        return
+
+    with ui.progress("[red]Close Game", total=None):
+        genshin_info.handle.close()
+
+        ui.log(
+            ":grey_question: Genshin Impact is already running. Please close it to continue.",
+        )
+
+        await utils.wait_for_async(lambda: not genshin.is_game_running())
+
+
+@tracing.traced("startup")
+async def start_game(
+    ui: UI,
+    fps_config: config.Configuration,
+    options: Options,
+) -> genshin.FPSState | None:
+    with ui.progress("[blue]Starting Genshin Impact", total=4) as progress:
+        genshin_info = await asyncio.to_thread(
+            genshin.start_game,
+            fps_config.genshin_path,
+        )
+
+        if not genshin_info:
+            ui.log(":no_entry: Could not find the Genshin Impact installation.")
+            ui.log(":grey_question: Please restart the bypass to redo the setup.")
+            config.delete_config()
+            return None
+
+        ui.log(
+            f":white_check_mark: Started Genshin Impact with PID {genshin_info.id}.",
+        )
+        progress.advance()
+
+        # Scan the modules on disk while the game is busy loading them.
+        prescan = genshin.start_prescan(fps_config.genshin_path)
+
+        logger.debug("Waiting for modules...")
+        modules = await genshin.wait_for_modules_async(genshin_info, MODULES_TIMEOUT)
+
+        logger.debug("Found modules:")
+        logger.debug(f"UnityPlayer.dll: {modules.unity_player!r}")
+        logger.debug(f"UserAssembly.dll: {modules.user_assembly!r}")
+
+        ui.log(
+            f":white_check_mark: Found {len(modules)} required modules.",
+        )
+        progress.advance()
+
+        logger.debug("Searching for pointers...")
+        with tracing.span("get_memory_pointers"):
+            pointers = await genshin.get_memory_pointers_async(
+                genshin_info,
+                modules,
+                workers=options.workers,
+                prescan=prescan,
+                timeout=POINTERS_TIMEOUT,
+            )
+
+        if not pointers:
+            ui.log(
+                ":no_entry: Failed to find offsets. Perhaps the game has updated?",
+            )
+            genshin_info.handle.close()
+            return None
+
+        logger.debug(f"Found pointers: {pointers!r}")
+        ui.log(
+            f":white_check_mark: Found the required memory pointers.",
+        )
+        progress.advance()
+
+        state = genshin.FPSState(
+            genshin=genshin_info,
+            modules=modules,
+            pointers=pointers,
+        )
+
+        logger.debug("Waiting for game to load...")
+
+        await state.wait_for_fps_async(GAME_LOAD_TIMEOUT)
+        ui.log(
+            f":white_check_mark: Game started!",
+        )
+        progress.advance()
+
+    return state
+
+
+async def prompt_fps(
+    ui: UI,
+    fps_config: config.Configuration,
+    scheduler: enforcement.EnforcementScheduler | supervisor.Supervisor,
+) -> None:
+    ui.log(":white_check_mark: FPS Bypass started!")
+    ui.log(":information_source: Press Ctrl+C to stop.")
+    ui.log(f":information_source: Current target FPS: {fps_config.target_fps}.")
+    ui.log(f":grey_question: Enter a new target FPS:")
+
+    # Set once the prompt is no longer needed, so the thread waiting for input
+    # finishes rather than holding up exiting.
+    cancelled = threading.Event()
+
+    try:
+        while True:
+            new_fps = await asyncio.to_thread(
+                lambda: ui.ask_int(
+                    "[blue]FPS Bypass >>[/blue]",
+                    default=utils.get_default_fps(),
+                    cancelled=cancelled,
+                ),
+            )
+
+            if not (config.MIN_FPS <= new_fps <= config.MAX_FPS):
+                ui.log(
+                    f":no_entry: Invalid FPS value. Must be between {config.MIN_FPS} and {config.MAX_FPS}.",
+                )
+                continue
+
+            fps_config.target_fps = new_fps
+            scheduler.target_fps = new_fps
+            config.write_config(fps_config)
+
+            ui.log(
+                f":white_check_mark: Target FPS set to {new_fps}.",
+            )
+    finally:
+        cancelled.set()
+
+
+async def enforce_fps(scheduler: enforcement.EnforcementScheduler) -> None:
+    try:
+        await scheduler.run_async()
+
+    # Game is likely closed.
+    except OSError:
+        logger.debug("Game closed (likely).")
+
+    logger.warning("FPS Bypass is no longer running.")
+
+
+def write_trace(ui: UI) -> None:
+    if not tracing.is_enabled():
+        return
+
+    tracing.write_chrome_trace(TRACE_PATH)
+    tracing.disable()
+    ui.log(f":information_source: Wrote the startup trace to {TRACE_PATH}.")
+
+
+async def write_trace_after_discovery(
+    ui: UI,
+    game_supervisor: supervisor.Supervisor,
+) -> None:
+    # Only startup is traced, which for a supervisor ends once it has attached
+    # to the instances already running.
+    await game_supervisor.wait_for_first_discovery()
+    write_trace(ui)
+
+
+async def run_until_first_done(*coros: Coroutine[Any, Any, None]) -> None:
+    """Runs the coroutines until any of them finishes, then cancels the rest."""
+
+    tasks = {asyncio.create_task(coro) for coro in coros}
+
+    try:
+        done, _ = await asyncio.wait(
+            tasks,
+            return_when=asyncio.FIRST_COMPLETED,
+        )
+    finally:
+        for task in tasks:
+            task.cancel()
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    for task in done:
+        # Re-raise anything unexpected.
+        task.result()
+
+
+async def supervise(
+    ui: UI,
+    fps_config: config.Configuration,
+    options: Options,
+) -> bool:
+    game_supervisor = supervisor.Supervisor(
+        fps_config.target_fps,
+        workers=options.workers,
+        min_interval=fps_config.enforce_min_interval,
+        max_interval=fps_config.enforce_max_interval,
+    )
+
+    ui.log(
+        ":information_source: Enforcing the FPS of every running Genshin Impact instance.",
+    )
+
+    trace_task = asyncio.create_task(
+        write_trace_after_discovery(ui, game_supervisor),
+    )
+
+    try:
+        # Runs until stopped with Ctrl+C.
+        await run_until_first_done(
+            game_supervisor.run(),
+            prompt_fps(ui, fps_config, game_supervisor),
+        )
+    finally:
+        trace_task.cancel()
+
+    return True
+
+
+def start_metrics_server(ui: UI) -> None:
+    try:
+        metrics_server = metrics.start_http_server()
+    except OSError:
+        logger.warning("Failed to start the metrics server.", exc_info=True)
+        return
+
+    host, port = metrics_server.server_address[:2]
+    ui.log(
+        f":information_source: Serving metrics at http://{host}:{port}/metrics.",
+    )
+
+
+async def run_daemon(
+    ui: UI,
+    fps_config: config.Configuration,
+    options: Options,
+) -> bool:
+    bypass_daemon = daemon.Daemon(fps_config, workers=options.workers)
+    trace_task = asyncio.create_task(
+        write_trace_after_discovery(ui, bypass_daemon.supervisor),
+    )
+
+    try:
+        await bypass_daemon.run()
+    except OSError as e:
+        ui.log(f":no_entry: Failed to start the daemon: {e}")
+        return False
+    finally:
+        trace_task.cancel()
+
+    return True
+
+
+async def run(ui: UI, options: Options) -> bool:
+    """Runs the bypass until the game closes, returning whether it succeeded."""
+
+    # Load config as we need the path.
+    fps_config = config.read_config() or await setup_config(ui)
+
+    if options.metrics:
+        start_metrics_server(ui)
+
+    if options.daemon:
+        return await run_daemon(ui, fps_config, options)
+
+    if options.multi:
+        return await supervise(ui, fps_config, options)
+
+    # Check if genshin is running (we need to start the game for the handle).
+    await wait_for_game_close(ui)
+
+    try:
+        state = await start_game(ui, fps_config, options)
+    except asyncio.TimeoutError:
+        ui.log(":no_entry: Timed out waiting for the game to start.")
+        return False
+    finally:
+        # Only startup is traced, as enforcement would grow the trace forever.
+        write_trace(ui)
+
+    if not state:
+        return False
+
+    scheduler = enforcement.EnforcementScheduler(
+        state,
+        fps_config.target_fps,
+        min_interval=fps_config.enforce_min_interval,
+        max_interval=fps_config.enforce_max_interval,
+    )
+
+    # Whichever finishes first (the game closing or the prompt failing) ends
+    # the other.
+    try:
+        await run_until_first_done(
+            enforce_fps(scheduler),
+            prompt_fps(ui, fps_config, scheduler),
+        )
+    finally:
+        scheduler.stop()
+        state.genshin.handle.close()
+
+    return True
@@ -7,8 +7,14 @@ import os
 from dataclasses import dataclass
 
 CONFIG_VERSION = 1
+OFFSET_CACHE_VERSION = 2
+SIGNATURE_STATS_VERSION = 1
 FPS_CONFIG_DIR = "gfps_bypass"
 
+# The range of valid target FPS values.
+MIN_FPS = 1
+MAX_FPS = 2147483647
+
 logger = logging.getLogger("rich")
 
 
@@ -17,21 +23,26 @@ logger = logging.getLogger("rich")
 class Configuration:
     genshin_path: str
     target_fps: int
+    # Bounds on how often the FPS is checked, in seconds.
+    enforce_min_interval: float = 0.01
+    enforce_max_interval: float = 0.5
 
 
 def _get_config_path() -> str:
-    app_data = os.getenv("APPDATA")
-
-    if not app_data:
-        raise RuntimeError("Failed to get APPDATA location.")
+    # APPDATA is only guaranteed on Windows, elsewhere use the XDG location.
+    app_data = (
+        os.getenv("APPDATA")
+        or os.getenv("XDG_CONFIG_HOME")
+        or os.path.join(os.path.expanduser("~"), ".config")
+    )
 
-    return f"{app_data}\\{FPS_CONFIG_DIR}"
+    return os.path.join(app_data, FPS_CONFIG_DIR)
 
 
 def _ensure_config_dir() -> None:
     config_path = _get_config_path()
     if not os.path.exists(config_path):
-        os.mkdir(config_path)
+        os.makedirs(config_path)
 
 
 def config_as_json(config: Configuration) -> str:
@@ -41,6 +52,8 @@ def config_as_json(config: Configuration) -> str:
         "data": {
             "genshin_path": config.genshin_path,
             "target_fps": config.target_fps,
+            "enforce_min_interval": config.enforce_min_interval,
+            "enforce_max_interval": config.enforce_max_interval,
         },
     }
 
@@ -54,9 +67,18 @@ def config_from_json(json_str: str) -> Configuration:
         # TODO: When we need to a new config version, we can add a migration
         ...
 
+    defaults = Configuration("", 0)
     return Configuration(
         genshin_path=data["data"]["genshin_path"],
         target_fps=data["data"]["target_fps"],
+        enforce_min_interval=data["data"].get(
+            "enforce_min_interval",
+            defaults.enforce_min_interval,
+        ),
+        enforce_max_interval=data["data"].get(
+            "enforce_max_interval",
+            defaults.enforce_max_interval,
+        ),
     )
 
 
@@ -64,7 +86,7 @@ def write_config(config: Configuration) -> None:
     _ensure_config_dir()
 
     config_path = _get_config_path()
-    with open(f"{config_path}\\config.json", "w") as f:
+    with open(os.path.join(config_path, "config.json"), "w") as f:
         f.write(config_as_json(config))
 
 
@@ -73,11 +95,11 @@ def read_config() -> Configuration | None:
     if not os.path.exists(config_path):
         return None
 
-    if not os.path.exists(f"{config_path}\\config.json"):
+    if not os.path.exists(os.path.join(config_path, "config.json")):
         return None
 
     try:
-        with open(f"{config_path}\\config.json") as f:
+        with open(os.path.join(config_path, "config.json")) as f:
             return config_from_json(f.read())
     except Exception:
         logger.debug("Failed to read the config file. Deleting it.", exc_info=True)
@@ -90,5 +112,147 @@ def delete_config() -> None:
     if not os.path.exists(config_path):
         return
 
-    os.remove(f"{config_path}\\config.json")
-    os.rmdir(config_path)
+    os.remove(os.path.join(config_path, "config.json"))
+    delete_offset_cache()
+    delete_signature_stats()
+
+    # User signatures are kept, along with the directory holding them.
+    if not os.listdir(config_path):
+        os.rmdir(config_path)
+
+
+# Offsets resolved by a previous launch, keyed by the fingerprint of the
+# modules they were found in.
+@dataclass
+class CachedOffsets:
+    # The key of the signature entry the offsets were found with.
+    signature: str
+    signature_rva: int
+    fps_rva: int
+
+
+OffsetCache = dict[str, CachedOffsets]
+
+
+def offset_cache_as_json(cache: OffsetCache) -> str:
+    data = {
+        "version": OFFSET_CACHE_VERSION,
+        "data": {
+            fingerprint: {
+                "signature": offsets.signature,
+                "signature_rva": offsets.signature_rva,
+                "fps_rva": offsets.fps_rva,
+            }
+            for fingerprint, offsets in cache.items()
+        },
+    }
+
+    return json.dumps(data, indent=4)
+
+
+def offset_cache_from_json(json_str: str) -> OffsetCache:
+    data = json.loads(json_str)
+
+    # The cache is cheap to rebuild, so it is simply discarded on changes.
+    if data["version"] != OFFSET_CACHE_VERSION:
+        return {}
+
+    return {
+        fingerprint: CachedOffsets(
+            signature=offsets["signature"],
+            signature_rva=offsets["signature_rva"],
+            fps_rva=offsets["fps_rva"],
+        )
+        for fingerprint, offsets in data["data"].items()
+    }
+
+
+def write_offset_cache(cache: OffsetCache) -> None:
+    _ensure_config_dir()
+
+    config_path = _get_config_path()
+    with open(os.path.join(config_path, "offsets.json"), "w") as f:
+        f.write(offset_cache_as_json(cache))
+
+
+def read_offset_cache() -> OffsetCache:
+    # The cache is only an optimisation, so any failure just means a rescan.
+    try:
+        config_path = _get_config_path()
+        if not os.path.exists(os.path.join(config_path, "offsets.json")):
+            return {}
+
+        with open(os.path.join(config_path, "offsets.json")) as f:
+            return offset_cache_from_json(f.read())
+    except Exception:
+        logger.debug("Failed to read the offset cache. Ignoring it.", exc_info=True)
+        return {}
+
+
+def delete_offset_cache() -> None:
+    config_path = _get_config_path()
+    if not os.path.exists(os.path.join(config_path, "offsets.json")):
+        return
+
+    os.remove(os.path.join(config_path, "offsets.json"))
+
+
+def get_user_signatures_path() -> str:
+    """Returns the path of the user's signature database, which is used over
+    the bundled one when it has a higher revision."""
+
+    return os.path.join(_get_config_path(), "signatures.json")
+
+
+# How many times each signature entry has led to the pointers, by key.
+SignatureStats = dict[str, int]
+
+
+def signature_stats_as_json(stats: SignatureStats) -> str:
+    data = {
+        "version": SIGNATURE_STATS_VERSION,
+        "data": stats,
+    }
+
+    return json.dumps(data, indent=4)
+
+
+def signature_stats_from_json(json_str: str) -> SignatureStats:
+    data = json.loads(json_str)
+
+    if data["version"] != SIGNATURE_STATS_VERSION:
+        return {}
+
+    return {key: int(successes) for key, successes in data["data"].items()}
+
+
+def write_signature_stats(stats: SignatureStats) -> None:
+    _ensure_config_dir()
+
+    config_path = _get_config_path()
+    with open(os.path.join(config_path, "signature_stats.json"), "w") as f:
+        f.write(signature_stats_as_json(stats))
+
+
+def read_signature_stats() -> SignatureStats:
+    try:
+        config_path = _get_config_path()
+        if not os.path.exists(os.path.join(config_path, "signature_stats.json")):
+            return {}
+
+        with open(os.path.join(config_path, "signature_stats.json")) as f:
+            return signature_stats_from_json(f.read())
+    except Exception:
+        logger.debug(
+            "Failed to read the signature stats. Ignoring them.",
+            exc_info=True,
+        )
+        return {}
+
+
+def delete_signature_stats() -> None:
+    config_path = _get_config_path()
+    if not os.path.exists(os.path.join(config_path, "signature_stats.json")):
+        return
+
+    os.remove(os.path.join(config_path, "signature_stats.json"))
@@ -0,0 +1,160 @@
+# Running the bypass unattended, controlled over IPC rather than a prompt.
+from __future__ import annotations
+
+import asyncio
+import logging
+
+import config
+import genshin
+import ipc
+import process
+import supervisor
+
+logger = logging.getLogger("rich")
+
+# How long to wait for further changes before writing the config, in seconds.
+CONFIG_WRITE_DELAY = 1.0
+
+# How long a control request may take to be handled, in seconds.
+REQUEST_TIMEOUT = 5.0
+
+
+class Daemon:
+    """Enforces the FPS of every running game instance, taking commands from a
+    `ipc.ControlServer` instead of the terminal."""
+
+    __slots__ = (
+        "fps_config",
+        "supervisor",
+        "address",
+        "persist_config",
+        "_loop",
+        "_config_changed",
+    )
+
+    def __init__(
+        self,
+        fps_config: config.Configuration,
+        backend: process.ProcessBackend = genshin.DEFAULT_BACKEND,
+        address: str | None = None,
+        workers: int = 1,
+        persist_config: bool = True,
+    ) -> None:
+        self.fps_config = fps_config
+        self.supervisor = supervisor.Supervisor(
+            fps_config.target_fps,
+            backend=backend,
+            workers=workers,
+            min_interval=fps_config.enforce_min_interval,
+            max_interval=fps_config.enforce_max_interval,
+        )
+        self.address = address
+        self.persist_config = persist_config
+
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._config_changed = asyncio.Event()
+
+    def _get_status(self) -> ipc.Message:
+        instances = []
+
+        for process_id, scheduler in list(self.supervisor.group.schedulers.items()):
+            try:
+                fps = scheduler.state.get_fps()
+            except OSError:
+                fps = None
+
+            instances.append(
+                {
+                    "id": process_id,
+                    "fps": fps,
+                    "checks": scheduler.stats.checks,
+                    "reverts": scheduler.stats.reverts,
+                    "interval": scheduler.interval,
+                },
+            )
+
+        return {
+            "ok": True,
+            "target_fps": self.supervisor.target_fps,
+            "attaching": len(self.supervisor.instances) - len(instances),
+            "instances": instances,
+        }
+
+    async def handle(self, request: ipc.Message) -> ipc.Message:
+        command = request.get("command")
+
+        if command == ipc.COMMAND_SET_FPS:
+            fps = request.get("fps")
+
+            # Booleans are ints too, as far as `isinstance` is concerned.
+            if type(fps) is not int or not (config.MIN_FPS <= fps <= config.MAX_FPS):
+                return {
+                    "ok": False,
+                    "error": (
+                        f"The FPS must be an integer between {config.MIN_FPS} "
+                        f"and {config.MAX_FPS}."
+                    ),
+                }
+
+            self.supervisor.target_fps = fps
+            self.fps_config.target_fps = fps
+            self._config_changed.set()
+
+            logger.info(f"Target FPS set to {fps}.")
+            return {"ok": True}
+
+        if command == ipc.COMMAND_GET_STATUS:
+            # Reads the game's memory.
+            return await asyncio.to_thread(self._get_status)
+
+        if command == ipc.COMMAND_STOP:
+            logger.info("Stopping on request.")
+            self.stop()
+            return {"ok": True}
+
+        return {"ok": False, "error": f"Unknown command {command!r}."}
+
+    def _handle_threadsafe(self, request: ipc.Message) -> ipc.Message:
+        # Called from the control server's threads.
+        assert self._loop is not None, "Handled a request while not running."
+
+        future = asyncio.run_coroutine_threadsafe(self.handle(request), self._loop)
+        return future.result(REQUEST_TIMEOUT)
+
+    async def _write_config_changes(self) -> None:
+        # Bursts of changes only write the config once, off the event loop.
+        while True:
+            await self._config_changed.wait()
+            await asyncio.sleep(CONFIG_WRITE_DELAY)
+            self._config_changed.clear()
+
+            try:
+                await asyncio.to_thread(config.write_config, self.fps_config)
+            except OSError:
+                logger.warning("Failed to write the config.", exc_info=True)
+
+    async def run(self) -> None:
+        """Runs until stopped, either by `stop` or the stop command."""
+
+        self._loop = asyncio.get_running_loop()
+        config_writer = None
+
+        if self.persist_config:
+            config_writer = asyncio.create_task(self._write_config_changes())
+
+        try:
+            with ipc.ControlServer(self._handle_threadsafe, self.address) as server:
+                logger.info(f"Listening for commands at {server.address}.")
+                await self.supervisor.run()
+        finally:
+            if config_writer is not None:
+                config_writer.cancel()
+
+            # Don't lose a change made just before stopping.
+            if self.persist_config and self._config_changed.is_set():
+                config.write_config(self.fps_config)
+
+            self._loop = None
+
+    def stop(self) -> None:
+        self.supervisor.stop()
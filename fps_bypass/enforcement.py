@@ -0,0 +1,351 @@
+# Keeping the game at the target FPS.
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from dataclasses import field
+
+import genshin
+import metrics
+
+logger = logging.getLogger("rich")
+
+DEFAULT_MIN_INTERVAL = 0.01
+DEFAULT_MAX_INTERVAL = 0.5
+
+# How much the interval grows by for every check the value is found unchanged.
+DEFAULT_BACKOFF = 1.5
+
+# Only the most recent latencies are kept, as a rough picture is all tuning needs.
+MAX_LATENCY_SAMPLES = 256
+
+_CHECKS = metrics.counter(
+    "fps_bypass_enforcement_checks_total",
+    "Checks of the game's FPS by the enforcement loop.",
+)
+_REVERTS = metrics.counter(
+    "fps_bypass_enforcement_reverts_total",
+    "Times the game's FPS was found changed from the target.",
+)
+_CORRECTION_SECONDS = metrics.histogram(
+    "fps_bypass_enforcement_correction_seconds",
+    "Upper bound on how long the game ran at another FPS before correction.",
+)
+
+
+@dataclass
+class EnforcementStats:
+    checks: int = 0
+    reverts: int = 0
+    # Upper bounds on how long the game ran at a different FPS before it was
+    # corrected, in seconds.
+    correction_latencies: list[float] = field(default_factory=list)
+
+    def record_correction(self, latency: float) -> None:
+        self.reverts += 1
+        self.correction_latencies.append(latency)
+
+        if len(self.correction_latencies) > MAX_LATENCY_SAMPLES:
+            del self.correction_latencies[0]
+
+    @property
+    def average_latency(self) -> float:
+        if not self.correction_latencies:
+            return 0.0
+
+        return sum(self.correction_latencies) / len(self.correction_latencies)
+
+    @property
+    def max_latency(self) -> float:
+        return max(self.correction_latencies, default=0.0)
+
+
+class EnforcementScheduler:
+    """Polls the game's FPS, correcting it whenever it differs from the target.
+
+    The game mostly resets the value in bursts (loading screens, settings
+    changes), so polling is fast right after a revert and backs off towards
+    `max_interval` while the value stays put."""
+
+    __slots__ = (
+        "state",
+        "min_interval",
+        "max_interval",
+        "backoff",
+        "stats",
+        "_target_fps",
+        "_target_changed",
+        "_interval",
+        "_last_checked",
+        "_wakeup",
+        "_async_wakeup",
+        "_stopped",
+    )
+
+    def __init__(
+        self,
+        state: genshin.FPSState,
+        target_fps: int,
+        min_interval: float = DEFAULT_MIN_INTERVAL,
+        max_interval: float = DEFAULT_MAX_INTERVAL,
+        backoff: float = DEFAULT_BACKOFF,
+    ) -> None:
+        if not 0 < min_interval <= max_interval:
+            raise ValueError("The intervals must satisfy 0 < min <= max.")
+
+        self.state = state
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.stats = EnforcementStats()
+
+        self._target_fps = target_fps
+        # The first write of a target is not a revert by the game.
+        self._target_changed = True
+        self._interval = min_interval
+        self._last_checked = time.monotonic()
+        self._wakeup = threading.Event()
+        self._async_wakeup: asyncio.Event | None = None
+        self._stopped = False
+
+    @property
+    def target_fps(self) -> int:
+        return self._target_fps
+
+    @target_fps.setter
+    def target_fps(self, fps: int) -> None:
+        self._target_fps = fps
+        self._target_changed = True
+
+        # Apply the new target straight away rather than after the current wait.
+        self._interval = self.min_interval
+        self._wake()
+
+    @property
+    def interval(self) -> float:
+        return self._interval
+
+    @property
+    def due_at(self) -> float:
+        """The `time.monotonic` time at which the next check is due."""
+
+        return self._last_checked + self._interval
+
+    def tick(self) -> float:
+        """Checks the FPS once, correcting it if needed. Returns how long to wait
+        until the next check."""
+
+        target_changed = self._target_changed
+        self._target_changed = False
+        target_fps = self._target_fps
+
+        old_fps = self.state.get_fps()
+        self.stats.checks += 1
+        _CHECKS.inc()
+
+        if old_fps != target_fps and target_changed:
+            self.state.set_fps(target_fps)
+            now = time.monotonic()
+            self._interval = self.min_interval
+
+            logger.debug(f"FPS target applied {old_fps} -> {target_fps}.")
+        elif old_fps != target_fps:
+            self.state.set_fps(target_fps)
+            now = time.monotonic()
+
+            # The revert happened at some point since the previous check.
+            latency = now - self._last_checked
+            self.stats.record_correction(latency)
+            _REVERTS.inc()
+            _CORRECTION_SECONDS.observe(latency)
+            self._interval = self.min_interval
+
+            logger.debug(
+                f"FPS change {old_fps} -> {target_fps} "
+                f"(corrected within {latency * 1000:.1f}ms).",
+            )
+        else:
+            now = time.monotonic()
+            self._interval = min(self._interval * self.backoff, self.max_interval)
+
+        self._last_checked = now
+        return self._interval
+
+    def _wake(self) -> None:
+        self._wakeup.set()
+
+        # Only ever set from within the loop running `run_async`.
+        if self._async_wakeup is not None:
+            self._async_wakeup.set()
+
+    def _step(self) -> float | None:
+        if self._stopped or not self.state.genshin.is_running():
+            return None
+
+        return self.tick()
+
+    def run(self) -> None:
+        """Enforces the FPS until stopped or the game closes. Raises `OSError` if
+        the game closes mid-check."""
+
+        while (delay := self._step()) is not None:
+            self._wakeup.wait(delay)
+            self._wakeup.clear()
+
+        self.log_stats()
+
+    async def run_async(self) -> None:
+        """Like `run`, with the game accessed from an executor so the event loop
+        stays free while waiting between checks."""
+
+        self._async_wakeup = asyncio.Event()
+
+        try:
+            while (delay := await asyncio.to_thread(self._step)) is not None:
+                try:
+                    await asyncio.wait_for(self._async_wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+
+                self._async_wakeup.clear()
+        finally:
+            self._async_wakeup = None
+
+        self.log_stats()
+
+    def log_stats(self) -> None:
+        logger.debug(
+            f"Enforcement of {self.state.genshin.id} stopped after "
+            f"{self.stats.checks} checks and "
+            f"{self.stats.reverts} reverts (correction latency avg "
+            f"{self.stats.average_latency * 1000:.1f}ms, max "
+            f"{self.stats.max_latency * 1000:.1f}ms).",
+        )
+
+    def stop(self) -> None:
+        self._stopped = True
+        self._wake()
+
+
+class EnforcementGroup:
+    """Enforces the same target FPS across several game instances from a single
+    loop, with each instance checked on its own adaptive schedule."""
+
+    __slots__ = (
+        "min_interval",
+        "max_interval",
+        "backoff",
+        "schedulers",
+        "_target_fps",
+        "_wakeup",
+        "_stopped",
+    )
+
+    def __init__(
+        self,
+        target_fps: int,
+        min_interval: float = DEFAULT_MIN_INTERVAL,
+        max_interval: float = DEFAULT_MAX_INTERVAL,
+        backoff: float = DEFAULT_BACKOFF,
+    ) -> None:
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        # Keyed by process ID.
+        self.schedulers: dict[int, EnforcementScheduler] = {}
+
+        self._target_fps = target_fps
+        self._wakeup: asyncio.Event | None = None
+        self._stopped = False
+
+    def __len__(self) -> int:
+        return len(self.schedulers)
+
+    @property
+    def target_fps(self) -> int:
+        return self._target_fps
+
+    @target_fps.setter
+    def target_fps(self, fps: int) -> None:
+        self._target_fps = fps
+
+        for scheduler in list(self.schedulers.values()):
+            scheduler.target_fps = fps
+
+        self._wake()
+
+    def add(self, state: genshin.FPSState) -> EnforcementScheduler:
+        scheduler = EnforcementScheduler(
+            state,
+            self._target_fps,
+            min_interval=self.min_interval,
+            max_interval=self.max_interval,
+            backoff=self.backoff,
+        )
+        self.schedulers[state.genshin.id] = scheduler
+        self._wake()
+
+        return scheduler
+
+    def remove(self, process_id: int) -> None:
+        scheduler = self.schedulers.pop(process_id, None)
+        if scheduler is not None:
+            scheduler.log_stats()
+
+    def _wake(self) -> None:
+        # Only ever set from within the loop running `run_async`.
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _step(self) -> float:
+        """Checks every instance that is due, dropping those which have closed.
+        Returns how long to wait until the next one is due."""
+
+        now = time.monotonic()
+
+        # Copied as instances may be added from the event loop meanwhile.
+        for process_id, scheduler in list(self.schedulers.items()):
+            if scheduler.due_at > now:
+                continue
+
+            try:
+                if scheduler.state.genshin.is_running():
+                    scheduler.tick()
+                    continue
+            except OSError:
+                logger.debug(f"Failed to check {process_id}.", exc_info=True)
+
+            logger.debug(f"Game instance {process_id} closed.")
+            self.remove(process_id)
+
+        next_due = min(
+            (scheduler.due_at for scheduler in list(self.schedulers.values())),
+            default=now + self.max_interval,
+        )
+        return max(next_due - time.monotonic(), 0.0)
+
+    async def run_async(self) -> None:
+        """Enforces the FPS of every instance in the group until stopped.
+        Instances can be added while running."""
+
+        self._wakeup = asyncio.Event()
+
+        try:
+            while not self._stopped:
+                delay = await asyncio.to_thread(self._step)
+
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+
+                self._wakeup.clear()
+        finally:
+            self._wakeup = None
+
+    def stop(self) -> None:
+        self._stopped = True
+        self._wake()
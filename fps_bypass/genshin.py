@@ -1,51 +1,78 @@
 # Game specific logic.
 from __future__ import annotations
 
+import asyncio
+import contextlib
+import logging
 import os
 import time
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
+from typing import Generator
 from typing import NamedTuple
 
+import config
 import memory
-import winapi
+import metrics
+import process
+import signatures
+import tracing
+import utils
+
+logger = logging.getLogger("rich")
 
 GENSHIN_OS_EXE = "GenshinImpact.exe"
 GENSHIN_CN_EXE = "YuanShen.exe"
+GAME_EXECUTABLES = (GENSHIN_OS_EXE, GENSHIN_CN_EXE)
 
-# Signatures taken from https://github.com/34736384/genshin-fps-unlock
-FPS_SIGNATURE = memory.Signature(
-    0xB9,
-    0x3C,
-    0x00,
-    0x00,
-    0x00,
-    0xFF,
-    0x15,
-)
+# How long a snapshot of the running processes is reused for, in seconds.
+PROCESS_TABLE_TTL = 0.5
+
+# How far from where a signature was in the last version of the game it is
+# searched for, before scanning everything. Patches rarely move it further. A
+# match found this way in another version must be the only one this close.
+HINT_MAX_DISTANCE = 16 * 1024 * 1024  # 16MB
+
+# The backend used for accessing the game when one is not specified.
+DEFAULT_BACKEND = process.default_backend()
+
+_process_tables: dict[int, process.ProcessTable] = {}
 
-FPS_SIGNATURE.compile()
+
+def get_process_table(
+    backend: process.ProcessBackend = DEFAULT_BACKEND,
+) -> process.ProcessTable:
+    """Returns the shared table of running game processes for the backend."""
+
+    table = _process_tables.get(id(backend))
+    if table is None or table.backend is not backend:
+        table = process.ProcessTable(backend, GAME_EXECUTABLES, PROCESS_TABLE_TTL)
+        _process_tables[id(backend)] = table
+
+    return table
 
 
 class GenshinModules(NamedTuple):
-    unity_player: winapi.ModuleInfo
-    user_assembly: winapi.ModuleInfo
+    unity_player: process.ModuleInfo
+    user_assembly: process.ModuleInfo
 
 
-def wait_for_modules(genshin: GenshinInfo) -> GenshinModules:
-    results = []
+def get_modules(genshin: GenshinInfo) -> GenshinModules | None:
+    """Returns the game's modules, or `None` if they are not loaded yet."""
 
-    while len(results) != 2:
-        try:
-            results = list(
-                winapi.get_modules(
-                    genshin.handle,
-                    lambda x: x in ("UnityPlayer.dll", "UserAssembly.dll"),
-                ),
-            )
-        except OSError:
-            pass
+    try:
+        results = list(
+            genshin.backend.get_modules(
+                genshin.handle,
+                lambda x: x in ("UnityPlayer.dll", "UserAssembly.dll"),
+            ),
+        )
+    except OSError:
+        return None
 
-        time.sleep(0.2)
+    if len(results) != 2:
+        return None
 
     if results[0].name == "UserAssembly.dll":
         return GenshinModules(
@@ -59,46 +86,177 @@ def wait_for_modules(genshin: GenshinInfo) -> GenshinModules:
     )
 
 
+@tracing.traced("startup")
+def wait_for_modules(genshin: GenshinInfo) -> GenshinModules:
+    return utils.wait_for(lambda: get_modules(genshin), 0.2)
+
+
+@tracing.traced("startup")
+async def wait_for_modules_async(
+    genshin: GenshinInfo,
+    timeout: float | None = None,
+) -> GenshinModules:
+    return await utils.wait_for_async(lambda: get_modules(genshin), 0.2, timeout)
+
+
+def get_module_paths(game_path: str) -> tuple[str, str]:
+    """Returns the on-disk paths of UnityPlayer.dll and UserAssembly.dll for
+    the game executable at the given path."""
+
+    directory, executable = os.path.split(game_path)
+    data_directory = os.path.splitext(executable)[0] + "_Data"
+
+    return (
+        os.path.join(directory, "UnityPlayer.dll"),
+        os.path.join(directory, data_directory, "Native", "UserAssembly.dll"),
+    )
+
+
+class SignatureMatch(NamedTuple):
+    # Relative to the start of UserAssembly.dll.
+    rva: int
+    entry: signatures.SignatureEntry
+
+
+def _format_fingerprint(name: str, header: memory.PEHeader) -> str:
+    return (
+        f"{name}:{header.timestamp:08X}:"
+        f"{header.image_size:08X}:{header.checksum:08X}"
+    )
+
+
+def get_file_fingerprint(path: str) -> str:
+    """Identifies the build of a module on disk, matching the fingerprint it
+    will have once loaded."""
+
+    with open(path, "rb") as f:
+        header = memory.parse_pe_header(f.read(memory.PE_HEADER_SIZE))
+
+    return _format_fingerprint(os.path.basename(path), header)
+
+
+class SignatureHint(NamedTuple):
+    # Where the signature was found, relative to the start of UserAssembly.dll.
+    rva: int
+    # The fingerprint of the UserAssembly.dll build it was found in.
+    build: str
+
+
+def get_signature_hint(entry: signatures.SignatureEntry) -> SignatureHint | None:
+    """Returns where the signature was last found, in any version of the
+    game."""
+
+    # The most recently found offsets are last.
+    for fingerprint, offsets in reversed(config.read_offset_cache().items()):
+        if offsets.signature == entry.key:
+            # Keyed by `get_modules_fingerprint`, starting with UserAssembly.dll's.
+            build = fingerprint.split("|", 1)[0]
+            return SignatureHint(offsets.signature_rva, build)
+
+    return None
+
+
+@tracing.traced("startup")
+def _prescan_fps_signature(game_path: str) -> SignatureMatch | None:
+    _, user_assembly_path = get_module_paths(game_path)
+
+    try:
+        build = get_file_fingerprint(user_assembly_path)
+
+        for entry in signatures.get_candidates(signatures.TARGET_FPS, build):
+            try:
+                hint = get_signature_hint(entry)
+                rva = memory.signature_scan_pe_file(
+                    user_assembly_path,
+                    entry.signature,
+                    hint.rva if hint is not None else None,
+                    HINT_MAX_DISTANCE,
+                    unique=True,
+                )
+            except memory.AmbiguousSignatureError as e:
+                logger.debug(f"FPS signature {entry.name!r} is ambiguous on disk. {e}")
+                continue
+
+            if rva is not None:
+                return SignatureMatch(rva, entry)
+    except (OSError, ValueError):
+        logger.debug("Failed to pre-scan UserAssembly.dll.", exc_info=True)
+
+    return None
+
+
+def start_prescan(game_path: str) -> Future[SignatureMatch | None]:
+    """Starts scanning UserAssembly.dll on disk for the FPS signature in the
+    background, so the scan overlaps with the game starting up."""
+
+    executor = ThreadPoolExecutor(max_workers=1)
+    future = executor.submit(_prescan_fps_signature, game_path)
+    executor.shutdown(wait=False)
+
+    return future
+
+
 class GenshinInfo(NamedTuple):
     id: int
     path: str
-    handle: winapi.Handle
+    handle: process.ProcessHandle
+    backend: process.ProcessBackend = DEFAULT_BACKEND
+
+    def read_memory(self, address: int, size: int) -> bytes:
+        return self.backend.read_memory(self.handle, address, size)
+
+    def read_memory_into(self, address: int, buffer: memoryview) -> int:
+        return self.backend.read_memory_into(self.handle, address, buffer)
+
+    def write_memory(self, address: int, data: bytes) -> None:
+        self.backend.write_memory(self.handle, address, data)
+
+    def is_running(self) -> bool:
+        """Checks whether this instance is still alive through its handle,
+        which is far cheaper than looking it up among all processes."""
 
+        return self.backend.is_process_running(self.handle)
 
-def start_game(path: str) -> GenshinInfo | None:
+
+@tracing.traced("startup")
+def start_game(
+    path: str,
+    backend: process.ProcessBackend = DEFAULT_BACKEND,
+) -> GenshinInfo | None:
     if not os.path.exists(path):
         return None
 
-    game = winapi.create_process(path)
+    game = backend.create_process(path)
+    get_process_table(backend).invalidate()
+
     return GenshinInfo(
         id=game.id,
         path=path,
         handle=game.handle,
+        backend=backend,
     )
 
 
-def is_game_running() -> bool:
-    return bool(
-        winapi.process_id_by_name(GENSHIN_OS_EXE)
-        or winapi.process_id_by_name(GENSHIN_CN_EXE),
-    )
+def is_game_running(backend: process.ProcessBackend = DEFAULT_BACKEND) -> bool:
+    return get_process_table(backend).first() is not None
 
 
-def get_running_game() -> GenshinInfo | None:
-    process_id = winapi.process_id_by_name(GENSHIN_OS_EXE) or winapi.process_id_by_name(
-        GENSHIN_CN_EXE,
-    )
+def get_running_game(
+    backend: process.ProcessBackend = DEFAULT_BACKEND,
+) -> GenshinInfo | None:
+    process_id = get_process_table(backend).first()
 
     if not process_id:
         return None
 
-    genshin = winapi.open_process(process_id)
-    path = winapi.get_process_path(genshin)
+    genshin = backend.open_process(process_id)
+    path = backend.get_process_path(genshin)
 
     return GenshinInfo(
         id=process_id,
         path=path,
         handle=genshin,
+        backend=backend,
     )
 
 
@@ -106,75 +264,373 @@ class MemoryPointers(NamedTuple):
     fps: int
 
 
-NULLPTR = bytearray(8)
+def get_module_fingerprint(genshin: GenshinInfo, module: process.ModuleInfo) -> str:
+    """Identifies the build of a loaded module using its PE header."""
 
+    header = memory.parse_pe_header(
+        genshin.read_memory(module.base, memory.PE_HEADER_SIZE),
+    )
 
-def get_memory_pointers(
+    return _format_fingerprint(module.name, header)
+
+
+def _iter_module_matches(
+    genshin: GenshinInfo,
+    module: process.ModuleInfo,
+    header: memory.PEHeader,
+    signature: memory.Signature,
+    workers: int,
+) -> Generator[int, None, None]:
+    # Only the sections the signature can be in are read, rather than
+    # the whole ~370MB module.
+    for section in memory.get_scan_sections(header, signature):
+        section_base = module.base + section.virtual_address
+        section_span = tracing.span(
+            "scan_section",
+            section=section.name,
+            size=section.size,
+            workers=workers,
+        )
+
+        with section_span:
+            if workers == 1:
+                # Stream the section through a reused buffer rather than reading
+                # it whole.
+                matches = memory.iter_signature_matches_chunked_into(
+                    genshin.read_memory_into,
+                    section_base,
+                    section.size,
+                    signature,
+                )
+            else:
+                # Spreading the scan across cores requires the whole section at
+                # once, read straight into memory shared with the workers. Only
+                # two matches are ever needed to tell whether it is unique.
+                matches = memory.iter_signature_matches_parallel_into(
+                    genshin.read_memory_into,
+                    section_base,
+                    section.size,
+                    signature,
+                    workers,
+                    limit=2,
+                )
+
+            with contextlib.closing(matches):
+                for res in matches:
+                    yield section.virtual_address + res
+
+
+def _scan_module(
+    genshin: GenshinInfo,
+    module: process.ModuleInfo,
+    header: memory.PEHeader,
+    signature: memory.Signature,
+    workers: int,
+) -> int | None:
+    """Scans the module for a signature, checking that it only matches once
+    so that the wrong address is never written to."""
+
+    return memory.find_unique(
+        _iter_module_matches(genshin, module, header, signature, workers),
+    )
+
+
+def _scan_module_near(
+    genshin: GenshinInfo,
+    module: process.ModuleInfo,
+    header: memory.PEHeader,
+    signature: memory.Signature,
+    hint: int,
+    unique: bool,
+) -> int | None:
+    section = header.find_section(hint)
+    if section not in memory.get_scan_sections(header, signature):
+        return None
+
+    with tracing.span("scan_near_hint", section=section.name, hint=hint):
+        res = memory.signature_scan_chunked_into_near(
+            genshin.read_memory_into,
+            module.base + section.virtual_address,
+            section.size,
+            signature,
+            hint - section.virtual_address,
+            max_distance=HINT_MAX_DISTANCE,
+            unique=unique,
+        )
+
+    if res is None:
+        return None
+
+    return section.virtual_address + res
+
+
+@tracing.traced("startup")
+def _find_fps_signature(
     genshin: GenshinInfo,
     modules: GenshinModules,
-) -> MemoryPointers | None:
-    # TODO: Optimise memory by not loading the whole thing at once.
+    workers: int,
+) -> SignatureMatch | None:
+    """Scans UserAssembly.dll for each of the FPS signatures in turn."""
+
     user_assembly = modules.user_assembly
-    user_assembly_buffer = winapi.read_memory(  # ~370MB
-        genshin.handle,
-        user_assembly.base,
-        user_assembly.size,
+    header = memory.parse_pe_header(
+        genshin.read_memory(user_assembly.base, memory.PE_HEADER_SIZE),
+    )
+    build = _format_fingerprint(user_assembly.name, header)
+
+    for entry in signatures.get_candidates(signatures.TARGET_FPS, build):
+        with tracing.span("scan_signature", signature=entry.name):
+            rva = None
+
+            try:
+                # Patches usually only move the signature a little, so search
+                # around where it last was before scanning everything. A match
+                # found there in the same build is where it always is, while
+                # in another build it must be the only one nearby.
+                if (hint := get_signature_hint(entry)) is not None:
+                    rva = _scan_module_near(
+                        genshin,
+                        user_assembly,
+                        header,
+                        entry.signature,
+                        hint.rva,
+                        unique=hint.build != build,
+                    )
+
+                if rva is None:
+                    rva = _scan_module(
+                        genshin,
+                        user_assembly,
+                        header,
+                        entry.signature,
+                        workers,
+                    )
+            except memory.AmbiguousSignatureError as e:
+                logger.warning(f"FPS signature {entry.name!r} is ambiguous. {e}")
+                continue
+
+        if rva is not None:
+            return SignatureMatch(rva, entry)
+
+        logger.debug(f"FPS signature {entry.name!r} was not found.")
+
+    return None
+
+
+def _resolve_fps_rva(
+    genshin: GenshinInfo,
+    modules: GenshinModules,
+    match: SignatureMatch,
+) -> int | None:
+    """Follows the code referenced by the FPS signature to the FPS variable,
+    returning its RVA within UnityPlayer.dll, or `None` if the game has not
+    initialised the pointer to it yet."""
+
+    # The path is once again stolen from https://github.com/34736384/genshin-fps-unlock
+    fps_address = match.entry.path.resolve(
+        genshin.read_memory,
+        modules.user_assembly.base + match.rva,
     )
-    unity_player = modules.unity_player
+    if fps_address is None:
+        return None
 
-    # FPS.
-    buffer_offset = 0
+    return fps_address - modules.unity_player.base
 
-    buffer_offset = memory.signature_scan(user_assembly_buffer, FPS_SIGNATURE)
 
-    if not buffer_offset:
-        return None
+def _verify_signature_match(
+    genshin: GenshinInfo,
+    modules: GenshinModules,
+    match: SignatureMatch,
+) -> bool:
+    """Cheaply checks that the matched signature is still at its RVA."""
+
+    signature = match.entry.signature
+
+    try:
+        buffer = genshin.read_memory(
+            modules.user_assembly.base + match.rva,
+            len(signature),
+        )
+    except OSError:
+        return False
 
-    # This is once again stolen from https://github.com/34736384/genshin-fps-unlock
-    # This is just a direct Python port of the C++ code.
-    rip = buffer_offset + 5
-    rip += (
-        int.from_bytes(user_assembly_buffer[rip + 2 : rip + 6], "little", signed=True)
-        + 6
+    return memory.signature_match(buffer, signature)
+
+
+def get_modules_fingerprint(genshin: GenshinInfo, modules: GenshinModules) -> str:
+    return (
+        f"{get_module_fingerprint(genshin, modules.user_assembly)}|"
+        f"{get_module_fingerprint(genshin, modules.unity_player)}"
     )
 
-    del user_assembly_buffer
 
-    genshin_ptr = user_assembly.base + rip
+def _record_success(entry: signatures.SignatureEntry) -> None:
+    try:
+        signatures.record_success(entry)
+    except OSError:
+        logger.debug("Failed to write the signature stats.", exc_info=True)
 
-    while (ptr := winapi.read_memory(genshin.handle, genshin_ptr, 8)) == NULLPTR:
-        time.sleep(0.2)
 
-    rip = int.from_bytes(ptr, "little", signed=False) - modules.unity_player.base
+@tracing.traced("startup")
+def get_cached_pointers(
+    genshin: GenshinInfo,
+    modules: GenshinModules,
+) -> MemoryPointers | None:
+    """Returns the pointers found by a previous launch of the same game
+    version, if they still match."""
 
-    unity_player_buffer = winapi.read_memory(  # ~30MB
-        genshin.handle,
-        unity_player.base,
-        unity_player.size,
+    # The game only changes on updates, so try the offsets of the last launch.
+    fingerprint = get_modules_fingerprint(genshin, modules)
+    cached = config.read_offset_cache().get(fingerprint)
+    if not cached:
+        return None
+
+    # The signature may have since been removed from the database.
+    entry = signatures.get_database().get_entry(
+        signatures.TARGET_FPS,
+        cached.signature,
     )
+    if entry is None:
+        return None
 
-    while unity_player_buffer[rip] in (0xE8, 0xE9):
-        rip += (
-            int.from_bytes(
-                unity_player_buffer[rip + 1 : rip + 5],
-                "little",
-                signed=True,
-            )
-            + 5
+    match = SignatureMatch(cached.signature_rva, entry)
+    if _verify_signature_match(genshin, modules, match):
+        logger.debug(f"Using cached offsets for {fingerprint}.")
+        _record_success(entry)
+        return MemoryPointers(
+            fps=modules.unity_player.base + cached.fps_rva,
         )
 
-    rip += (
-        int.from_bytes(unity_player_buffer[rip + 2 : rip + 6], "little", signed=True)
-        + 6
+    return None
+
+
+def find_fps_signature(
+    genshin: GenshinInfo,
+    modules: GenshinModules,
+    workers: int = 1,
+    prescan: Future[SignatureMatch | None] | None = None,
+) -> SignatureMatch | None:
+    """Finds an FPS signature in UserAssembly.dll, preferring the result of
+    a pre-scan over scanning the game's memory."""
+
+    match = None
+    if prescan is not None:
+        with tracing.span("wait_for_prescan"):
+            match = prescan.result()
+
+        # The file on disk may not be what was loaded (eg. mid-update).
+        if match is not None and not _verify_signature_match(
+            genshin,
+            modules,
+            match,
+        ):
+            logger.debug("Pre-scanned offset did not match the loaded module.")
+            match = None
+
+    if match is None:
+        match = _find_fps_signature(genshin, modules, workers)
+
+    return match
+
+
+def resolve_memory_pointers(
+    genshin: GenshinInfo,
+    modules: GenshinModules,
+    match: SignatureMatch,
+) -> MemoryPointers | None:
+    """Resolves the pointers from the FPS signature, caching their offsets.
+    Returns `None` if the game has not initialised them yet."""
+
+    fps_rva = _resolve_fps_rva(genshin, modules, match)
+    if fps_rva is None:
+        return None
+
+    offsets = config.CachedOffsets(
+        signature=match.entry.key,
+        signature_rva=match.rva,
+        fps_rva=fps_rva,
     )
+    offset_cache = config.read_offset_cache()
+    fingerprint = get_modules_fingerprint(genshin, modules)
+
+    # Other instances of the same version may have cached them already.
+    if offset_cache.get(fingerprint) != offsets:
+        # Moved to the end, keeping the most recent offsets last for hints.
+        offset_cache.pop(fingerprint, None)
+        offset_cache[fingerprint] = offsets
 
-    fps_ptr = rip + unity_player.base
+        try:
+            config.write_offset_cache(offset_cache)
+        except OSError:
+            logger.debug("Failed to write the offset cache.", exc_info=True)
 
+    _record_success(match.entry)
     return MemoryPointers(
-        fps=fps_ptr,
+        fps=modules.unity_player.base + fps_rva,
     )
 
 
+def get_memory_pointers(
+    genshin: GenshinInfo,
+    modules: GenshinModules,
+    workers: int = 1,
+    prescan: Future[SignatureMatch | None] | None = None,
+) -> MemoryPointers | None:
+    if pointers := get_cached_pointers(genshin, modules):
+        return pointers
+
+    match = find_fps_signature(genshin, modules, workers, prescan)
+    if match is None:
+        return None
+
+    with tracing.span("wait_for_pointers"):
+        return utils.wait_for(
+            lambda: resolve_memory_pointers(genshin, modules, match),
+            0.2,
+        )
+
+
+async def get_memory_pointers_async(
+    genshin: GenshinInfo,
+    modules: GenshinModules,
+    workers: int = 1,
+    prescan: Future[SignatureMatch | None] | None = None,
+    timeout: float | None = None,
+) -> MemoryPointers | None:
+    """Like `get_memory_pointers`, with the scan run in an executor and the
+    wait for the game to initialise the pointers bounded by `timeout`."""
+
+    if pointers := await asyncio.to_thread(get_cached_pointers, genshin, modules):
+        return pointers
+
+    match = await asyncio.to_thread(
+        find_fps_signature,
+        genshin,
+        modules,
+        workers,
+        prescan,
+    )
+    if match is None:
+        return None
+
+    with tracing.span("wait_for_pointers"):
+        return await utils.wait_for_async(
+            lambda: resolve_memory_pointers(genshin, modules, match),
+            0.2,
+            timeout,
+        )
+
+
+_FPS_READ_SECONDS = metrics.histogram(
+    "fps_bypass_fps_read_seconds",
+    "Time taken to read the game's FPS.",
+)
+_FPS_WRITE_SECONDS = metrics.histogram(
+    "fps_bypass_fps_write_seconds",
+    "Time taken to write the game's FPS.",
+)
+
+
 @dataclass
 class FPSState:
     genshin: GenshinInfo
@@ -182,16 +638,27 @@ class FPSState:
     pointers: MemoryPointers
 
     # Sometimes the game takes a while to start up.
+    @tracing.traced("startup")
     def wait_for_fps(self) -> None:
         while self.get_fps() == -1:
             time.sleep(0.2)
 
+    @tracing.traced("startup")
+    async def wait_for_fps_async(self, timeout: float | None = None) -> None:
+        await utils.wait_for_async(lambda: self.get_fps() != -1, 0.2, timeout)
+
     def set_fps(self, fps: int) -> None:
         # FPS is an i32.
         fps_bytes = fps.to_bytes(4, "little", signed=True)
-        winapi.write_memory(self.genshin.handle, self.pointers.fps, fps_bytes)
+
+        start_time = time.perf_counter()
+        self.genshin.write_memory(self.pointers.fps, fps_bytes)
+        _FPS_WRITE_SECONDS.observe(time.perf_counter() - start_time)
 
     def get_fps(self) -> int:
         # FPS is an i32.
-        fps_bytes = winapi.read_memory(self.genshin.handle, self.pointers.fps, 4)
+        start_time = time.perf_counter()
+        fps_bytes = self.genshin.read_memory(self.pointers.fps, 4)
+        _FPS_READ_SECONDS.observe(time.perf_counter() - start_time)
+
         return int.from_bytes(fps_bytes, "little", signed=True)
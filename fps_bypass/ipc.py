@@ -0,0 +1,197 @@
+# Controlling a running bypass from other processes, over a named pipe on
+# Windows and a Unix socket elsewhere.
+from __future__ import annotations
+
+import json
+import logging
+import os
+import tempfile
+import threading
+from multiprocessing.connection import Client
+from multiprocessing.connection import Connection
+from multiprocessing.connection import Listener
+from typing import Any
+from typing import Callable
+
+logger = logging.getLogger("rich")
+
+CONTROL_NAME = "fps_bypass"
+
+COMMAND_SET_FPS = "set-fps"
+COMMAND_GET_STATUS = "get-status"
+COMMAND_STOP = "stop"
+COMMANDS = (COMMAND_SET_FPS, COMMAND_GET_STATUS, COMMAND_STOP)
+
+# Requests and responses are JSON objects, rather than pickles which would let
+# any local process run code in the bypass.
+Message = dict[str, Any]
+RequestHandler = Callable[[Message], Message]
+
+# Requests are tiny, so anything bigger is not from a client.
+MAX_MESSAGE_SIZE = 0x10000
+
+
+class ControlError(Exception):
+    """Raised by the client when the bypass rejects a request."""
+
+
+def default_address() -> str:
+    if os.name == "nt":
+        return rf"\\.\pipe\{CONTROL_NAME}"
+
+    return os.path.join(tempfile.gettempdir(), f"{CONTROL_NAME}.sock")
+
+
+def _send(connection: Connection, message: Message) -> None:
+    connection.send_bytes(json.dumps(message).encode())
+
+
+def _receive(connection: Connection) -> Message:
+    message = json.loads(connection.recv_bytes(MAX_MESSAGE_SIZE))
+
+    if not isinstance(message, dict):
+        raise ValueError("Messages must be JSON objects.")
+
+    return message
+
+
+def _remove_stale_socket(address: str) -> None:
+    if os.name == "nt" or not os.path.exists(address):
+        return
+
+    # A socket left behind by a bypass that did not exit cleanly.
+    try:
+        Client(address).close()
+    except OSError:
+        os.remove(address)
+    else:
+        raise OSError(f"A bypass is already listening at {address}.")
+
+
+class ControlServer:
+    """Accepts control connections on a background thread, passing each request
+    to `handler` (from the connection's own thread) and replying with what it
+    returns."""
+
+    __slots__ = (
+        "address",
+        "handler",
+        "_listener",
+        "_thread",
+        "_closed",
+    )
+
+    def __init__(self, handler: RequestHandler, address: str | None = None) -> None:
+        self.address = address or default_address()
+        self.handler = handler
+
+        _remove_stale_socket(self.address)
+        self._listener = Listener(self.address)
+        self._thread = threading.Thread(
+            target=self._accept_forever,
+            name="control",
+            daemon=True,
+        )
+        self._closed = False
+
+    def __enter__(self) -> ControlServer:
+        self.start()
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def _accept_forever(self) -> None:
+        while not self._closed:
+            try:
+                connection = self._listener.accept()
+            except OSError:
+                if self._closed:
+                    return
+
+                logger.debug("Failed to accept a control connection.", exc_info=True)
+                continue
+
+            threading.Thread(
+                target=self._serve,
+                args=(connection,),
+                daemon=True,
+            ).start()
+
+    def _serve(self, connection: Connection) -> None:
+        with connection:
+            while not self._closed:
+                try:
+                    request = _receive(connection)
+                except (EOFError, OSError):
+                    return
+                except ValueError as e:
+                    _send(connection, {"ok": False, "error": f"Bad request: {e}"})
+                    continue
+
+                try:
+                    response = self.handler(request)
+                except Exception as e:
+                    logger.debug("Failed to handle a control request.", exc_info=True)
+                    response = {"ok": False, "error": str(e)}
+
+                try:
+                    _send(connection, response)
+                except OSError:
+                    return
+
+    def close(self) -> None:
+        if self._closed:
+            return
+
+        self._closed = True
+
+        # Closing the listener does not interrupt a pending accept on every
+        # platform, so connect to wake it up first.
+        if self._thread.is_alive():
+            try:
+                Client(self.address).close()
+            except OSError:
+                pass
+
+        self._listener.close()
+        self._thread.join(1)
+
+
+class ControlClient:
+    """Sends commands to a running bypass."""
+
+    __slots__ = ("_connection",)
+
+    def __init__(self, address: str | None = None) -> None:
+        self._connection = Client(address or default_address())
+
+    def __enter__(self) -> ControlClient:
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def request(self, command: str, **arguments: Any) -> Message:
+        _send(self._connection, {"command": command, **arguments})
+        response = _receive(self._connection)
+
+        if not response.get("ok"):
+            raise ControlError(response.get("error", "Unknown error."))
+
+        return response
+
+    def set_fps(self, fps: int) -> None:
+        self.request(COMMAND_SET_FPS, fps=fps)
+
+    def get_status(self) -> Message:
+        return self.request(COMMAND_GET_STATUS)
+
+    def stop(self) -> None:
+        self.request(COMMAND_STOP)
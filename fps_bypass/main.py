@@ -1,252 +1,146 @@
 from __future__ import annotations
 
 import os
+import sys
 
 VERSION = (0, 1, 6)
 
 ERR_SUCCESS = 0
 ERR_FAILURE = 1
 
-MIN_FPS = 1
-MAX_FPS = 2147483647
-
-if os.name != "nt":
-    print("This script is only compatible with Windows.")
-    exit(ERR_FAILURE)
+# NOTE: Everything else is imported within `main`, keeping `import main` (and
+# reaching the first output) cheap. See `make import-budget`.
 
-import threading
-import logging
-import sys
-
-import winapi
-import genshin
-import time
-import utils
-import config
-
-if not winapi.has_uac():
-    print("Administrator privileges are required to run this script.")
-    utils.exit_pause()
-    exit(ERR_FAILURE)
-
-
-from rich.console import Console
-from rich.progress import Progress
-from rich.progress import TextColumn
-from rich.progress import BarColumn
-from rich.progress import TaskProgressColumn
-from rich.logging import RichHandler
-from rich.traceback import install
-from rich.prompt import IntPrompt
-
-console = Console()
-install(console=console)
-
-console.print(
-    f"FPS Bypass v{utils.make_version_string(VERSION)}",
-    style="bold underline blue",
-    highlight=False,
-)
-
-is_debug_mode = "debug" in sys.argv
-
-logging.basicConfig(
-    level=logging.DEBUG if is_debug_mode else logging.INFO,
-    format="%(message)s",
-    datefmt="[%X]",
-    handlers=[
-        RichHandler(
-            rich_tracebacks=True,
-            console=console,
-        ),
-    ],
-)
-
-logger = logging.getLogger("rich")
-
-
-def _make_progress_bar() -> Progress:
-    return Progress(
-        TextColumn("[progress.description]{task.description}"),
-        BarColumn(),
-        TaskProgressColumn(),
-        transient=True,
-        console=console,
-    )
 
+def control(argv: list[str]) -> int:
+    """Sends a command to a running daemon, printing its response."""
 
-# Load config as we need the path.
-fps_config = config.read_config()
+    import json
 
-if not fps_config:
-    with _make_progress_bar() as progress:
-        task = progress.add_task("[blue]First Time Setup", start=False, total=2)
-        console.log(":grey_question: Please open Genshin Impact to continue.")
+    import ipc
 
-        instance = utils.wait_for(genshin.get_running_game)
+    command, *arguments = argv
+    request = {}
 
-        console.log(
-            f":white_check_mark: Found Genshin Impact with PID {instance.id}.",
-        )
-        progress.update(task, advance=1)
+    if command == ipc.COMMAND_SET_FPS:
+        try:
+            request["fps"] = int(arguments[0])
+        except (IndexError, ValueError):
+            print(f"Usage: {ipc.COMMAND_SET_FPS} <fps>")
+            return ERR_FAILURE
 
-        # Create config.
-        game_path = winapi.get_process_path(instance.handle)
-        fps_value = utils.get_default_fps()
+    try:
+        with ipc.ControlClient() as client:
+            response = client.request(command, **request)
+    except (OSError, ipc.ControlError) as e:
+        print(f"Failed to control the bypass: {e}")
+        return ERR_FAILURE
 
-        logger.debug(f"Game path: {game_path!r}")
-        logger.debug(f"Default FPS: {fps_value}")
+    print(json.dumps(response, indent=4))
+    return ERR_SUCCESS
 
-        fps_config = config.Configuration(
-            genshin_path=game_path,
-            target_fps=fps_value,
-        )
 
-        config.write_config(fps_config)
+def get_scan_workers(args: set[str]) -> int | None:
+    """Returns how many processes a full scan is split across. One unless asked
+    for with `parallel` (one per core) or `parallel=<workers>`. `None` if the
+    number of workers given is invalid."""
 
-        console.log(
-            f":white_check_mark: Configuration complete!",
-        )
-        progress.update(task, advance=1)
+    if "parallel" in args:
+        return os.cpu_count() or 1
 
+    for arg in args:
+        if arg.startswith("parallel="):
+            try:
+                workers = int(arg.partition("=")[2])
+            except ValueError:
+                return None
 
-# Check if genshin is running (we need to start the game for the handle).
-genshin_info = genshin.get_running_game()
+            return workers if workers > 0 else None
 
-if genshin_info:
-    with _make_progress_bar() as progress:
-        genshin_info.handle.close()
-        task = progress.add_task("[red]Close Game", start=False, total=None)
+    return 1
 
-        console.log(
-            ":grey_question: Genshin Impact is already running. Please close it to continue.",
-        )
 
-        utils.wait_for(lambda: not genshin.is_game_running())
+def main(argv: list[str] | None = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    args = set(argv)
 
-with _make_progress_bar() as progress:
-    task = progress.add_task("[blue]Starting Genshin Impact", start=False, total=4)
-    genshin_info = genshin.start_game(fps_config.genshin_path)
+    # Commands for a running daemon, which work from anywhere.
+    if argv and argv[0] in ("set-fps", "get-status", "stop"):
+        return control(argv)
 
-    if not genshin_info:
-        console.log(":no_entry: Could not find the Genshin Impact installation.")
-        console.log(":grey_question: Please restart the bypass to redo the setup.")
-        config.delete_config()
-        utils.exit_pause()
-        exit(ERR_FAILURE)
+    workers = get_scan_workers(args)
+    if workers is None:
+        print("Usage: parallel=<workers>, with at least one worker.")
+        return ERR_FAILURE
 
-    console.log(
-        f":white_check_mark: Started Genshin Impact with PID {genshin_info.id}.",
-    )
-    progress.update(task, advance=1)
+    if os.name != "nt":
+        print("This script is only compatible with Windows.")
+        return ERR_FAILURE
 
-    logger.debug("Waiting for modules...")
-    modules = genshin.wait_for_modules(genshin_info)
+    import utils
+    import winapi
 
-    logger.debug("Found modules:")
-    logger.debug(f"UnityPlayer.dll: {modules.unity_player!r}")
-    logger.debug(f"UserAssembly.dll: {modules.user_assembly!r}")
+    if not winapi.has_uac():
+        print("Administrator privileges are required to run this script.")
+        # Nobody is watching the daemon to press a key.
+        if "daemon" not in args:
+            utils.exit_pause()
 
-    console.log(
-        f":white_check_mark: Found {len(modules)} required modules.",
-    )
-    progress.update(task, advance=1)
+        return ERR_FAILURE
 
-    logger.debug("Searching for pointers...")
-    pointers = genshin.get_memory_pointers(genshin_info, modules)
+    import ui
 
-    if not pointers:
-        console.log(":no_entry: Failed to find offsets. Perhaps the game has updated?")
-        utils.exit_pause()
-        exit(ERR_FAILURE)
+    # Plain text output skips importing rich altogether, and the daemon has
+    # nobody watching it.
+    is_plain = "plain" in args or "daemon" in args
+    console = ui.PlainUI() if is_plain else ui.RichUI()
+    console.title(f"FPS Bypass v{utils.make_version_string(VERSION)}")
 
-    logger.debug(f"Found pointers: {pointers!r}")
-    console.log(
-        f":white_check_mark: Found the required memory pointers.",
-    )
-    progress.update(task, advance=1)
+    import logging
 
-    state = genshin.FPSState(
-        genshin=genshin_info,
-        modules=modules,
-        pointers=pointers,
+    logging.basicConfig(
+        level=logging.DEBUG if "debug" in args else logging.INFO,
+        format="%(message)s",
+        datefmt="[%X]",
+        handlers=[console.logging_handler()],
     )
 
-    logger.debug("Waiting for game to load...")
+    import tracing
 
-    utils.wait_for(lambda: state.get_fps() != -1)
-    console.log(
-        f":white_check_mark: Game started!",
-    )
-    progress.update(task, advance=1)
+    if "trace" in args:
+        tracing.enable()
 
-enforce_fps = True
+    import asyncio
 
+    import app
 
-def fps_enforcement_thread() -> None:
-    assert fps_config is not None, "Started enforcement thread without config."
+    options = app.Options(
+        multi="multi" in args,
+        daemon="daemon" in args,
+        metrics="metrics" in args,
+        workers=workers,
+    )
 
     try:
-        while enforce_fps and genshin.is_game_running():
-            if (old_fps := state.get_fps()) != fps_config.target_fps:
-                state.set_fps(fps_config.target_fps)
-                logger.debug(f"FPS change {old_fps} -> {fps_config.target_fps}.")
-
-            time.sleep(0.1)
-
-    # Game is likely closed.
-    except OSError:
-        logger.debug("Game closed (likely).")
-
-    logging.warning("FPS Bypass is no longer running.")
-    os._exit(ERR_SUCCESS)
-
-
-enforcement_thread = threading.Thread(
-    target=fps_enforcement_thread,
-    daemon=True,
-)
-
-enforcement_thread.start()
-
-console.log(":white_check_mark: FPS Bypass started!")
-console.log(":information_source: Press Ctrl+C to stop.")
-console.log(f":information_source: Current target FPS: {fps_config.target_fps}.")
-console.log(f":grey_question: Enter a new target FPS:")
-prompt = IntPrompt(
-    console=console,
-)
-
-try:
-    while True:
-        if not genshin.is_game_running():
-            break
-
-        new_fps = prompt.ask(
-            prompt="[blue]FPS Bypass >>[/blue]",
-            default=utils.get_default_fps(),
-            show_default=False,
-        )
+        success = asyncio.run(app.run(console, options))
+    except KeyboardInterrupt:
+        console.log("Stopping FPS Bypass...")
+        success = True
 
-        if not (MIN_FPS <= new_fps <= MAX_FPS):
-            console.log(
-                f":no_entry: Invalid FPS value. Must be between {MIN_FPS} and {MAX_FPS}.",
-            )
-            continue
+    app.write_trace(console)
 
-        fps_config.target_fps = new_fps
-        config.write_config(fps_config)
+    if not success:
+        if "daemon" not in args:
+            utils.exit_pause()
 
-        console.log(
-            f":white_check_mark: Target FPS set to {new_fps}.",
-        )
+        return ERR_FAILURE
 
-except KeyboardInterrupt:
-    console.log("Stopping FPS Bypass...")
+    return ERR_SUCCESS
 
-enforce_fps = False
-enforcement_thread.join()
-state.genshin.handle.close()
 
+if __name__ == "__main__":
+    # Scan workers are started as new processes of the executable.
+    import multiprocessing
 
-exit(ERR_SUCCESS)
+    multiprocessing.freeze_support()
+    exit(main())
@@ -1,24 +1,79 @@
 # Tools to assist with memory reading and writing.
 from __future__ import annotations
 
+import collections
+import contextlib
 import logging
+import math
+import mmap
+import os
+import re
+import struct
+import threading
 import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 from typing import Callable
+from typing import Generator
+from typing import Iterator
+from typing import NamedTuple
+from typing import Union
 
 import utils
 
 logger = logging.getLogger("rich")
 
+# Anything supporting the buffer protocol (`bytes`, `bytearray`, `memoryview`,
+# `mmap`...).
+Buffer = Union[bytes, bytearray, memoryview, mmap.mmap]
+
+# Signature scanning engines.
+ENGINE_EXEC = "exec"  # Generated Python, anchored on `bytes.index`.
+ENGINE_REGEX = "regex"  # Precompiled bytes regex, matched entirely in C.
+# Vectorised byte comparisons. Needs NumPy, falling back to the regex engine.
+ENGINE_NUMPY = "numpy"
+
+ENGINES = (
+    ENGINE_EXEC,
+    ENGINE_REGEX,
+    ENGINE_NUMPY,
+)
+
+# Used by signatures which do not request a specific engine.
+default_engine = ENGINE_EXEC
+
+
+def set_default_engine(engine: str) -> None:
+    """Sets the engine used by signatures which do not specify one."""
+
+    global default_engine
+
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown signature engine {engine!r}.")
+
+    default_engine = engine
+
 
 class Signature:
     __slots__ = (
         "pattern",
-        "_scan",
+        "engine",
+        "sections",
+        "_scans",
     )
 
-    def __init__(self, *pattern):
+    def __init__(
+        self,
+        *pattern,
+        engine: str | None = None,
+        sections: tuple[str, ...] | None = None,
+    ):
         self.pattern = pattern
-        self._scan = None
+        self.engine = engine
+        # PE sections to search when scanning a module. `None` means all the
+        # executable ones, as most signatures are of code.
+        self.sections = sections
+        self._scans = {}
 
     def __repr__(self) -> str:
         start = "Signature("
@@ -45,16 +100,52 @@ class Signature:
 
         return self.pattern == __o.pattern
 
-    def compile(self) -> SignatureFunction:
-        """Compiles a signature into a Python function."""
-        if self._scan is None:
-            self._scan = compile_signature(self)
+    def __hash__(self) -> int:
+        return hash(self.pattern)
 
-        return self._scan
+    @classmethod
+    def from_string(cls, pattern: str, **kwargs) -> Signature:
+        """Parses a signature written as hex bytes separated by spaces, with
+        `??` (or `?`) for wildcards, eg. `"B9 3C ?? 00"`."""
 
+        return cls(
+            *(
+                None if byte in ("?", "??") else int(byte, 16)
+                for byte in pattern.split()
+            ),
+            **kwargs,
+        )
 
-def signature_scan(buffer: bytes, signature: Signature) -> int | None:
-    func = signature.compile()
+    def compile(self, engine: str | None = None) -> SignatureFunction:
+        """Compiles a signature into a Python function using the given engine,
+        falling back to the signature's engine and then the default one."""
+        engine = engine or self.engine or default_engine
+
+        if engine not in self._scans:
+            self._scans[engine] = compile_signature(self, engine)
+
+        return self._scans[engine]
+
+
+def _supports_index(buffer: Buffer) -> bool:
+    return isinstance(buffer, (bytes, bytearray))
+
+
+def _get_scanner(buffer: Buffer, signature: Signature) -> SignatureFunction:
+    # Only `bytes` and `bytearray` have the `index` the exec engine relies on,
+    # while the other engines work on any buffer.
+    engine = signature.engine or default_engine
+    if engine == ENGINE_EXEC and not _supports_index(buffer):
+        engine = ENGINE_REGEX
+
+    return signature.compile(engine)
+
+
+def signature_scan(buffer: Buffer, signature: Signature) -> int | None:
+    """Scans a buffer for a signature. Any object supporting the buffer
+    protocol may be scanned in place."""
+
+    func = _get_scanner(buffer, signature)
 
     start_time = time.perf_counter()
     res = func(buffer)
@@ -71,6 +162,701 @@ def signature_scan(buffer: bytes, signature: Signature) -> int | None:
     return res
 
 
+def iter_signature_matches(
+    buffer: Buffer,
+    signature: Signature,
+    start: int = 0,
+    end: int | None = None,
+) -> Generator[int, None, None]:
+    """Lazily yields the offset of every match in `[start, end)` of a buffer,
+    lowest first. Overlapping matches are included."""
+
+    func = _get_scanner(buffer, signature)
+    if end is None:
+        end = len(buffer)
+
+    while (res := func(buffer, start, end)) is not None:
+        yield res
+        start = res + 1
+
+
+# Reads `size` bytes at `address` from whatever is being scanned. Keeping this
+# a plain callable allows scanning a remote process, a file or a buffer alike.
+MemoryReader = Callable[[int, int], bytes]
+
+# Reads from `address` into a writable buffer, returning the number of bytes
+# read. Lets the caller own (and reuse) the memory being read into.
+MemoryIntoReader = Callable[[int, memoryview], int]
+
+DEFAULT_CHUNK_SIZE = 16 * 1024 * 1024  # 16MB
+
+
+def buffer_reader(buffer: bytes) -> MemoryReader:
+    """Creates a reader over an in-memory buffer, where addresses are offsets."""
+
+    return lambda address, size: buffer[address : address + size]
+
+
+def file_reader(fd: int) -> MemoryReader:
+    """Creates a reader over a file descriptor (such as `/proc/<pid>/mem`),
+    where addresses are file offsets."""
+
+    return lambda address, size: os.pread(fd, size, address)
+
+
+def reader_into(read: MemoryReader) -> MemoryIntoReader:
+    """Adapts a reader returning `bytes` into one filling a buffer."""
+
+    def read_into(address: int, buffer: memoryview) -> int:
+        data = read(address, len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+    return read_into
+
+
+class BufferPool:
+    """Hands out reusable buffers for large reads, so that repeated scans do not
+    allocate (and copy) tens of MB each time."""
+
+    __slots__ = (
+        "max_buffers",
+        "_buffers",
+        "_lock",
+    )
+
+    def __init__(self, max_buffers: int = 2) -> None:
+        self.max_buffers = max_buffers
+        self._buffers: list[bytearray] = []
+        self._lock = threading.Lock()
+
+    def acquire(self, size: int) -> bytearray:
+        """Returns a buffer of at least `size` bytes."""
+
+        with self._lock:
+            for i, buffer in enumerate(self._buffers):
+                if len(buffer) >= size:
+                    return self._buffers.pop(i)
+
+        return bytearray(size)
+
+    def release(self, buffer: bytearray) -> None:
+        """Returns a buffer to the pool to be reused."""
+
+        with self._lock:
+            if len(self._buffers) < self.max_buffers:
+                self._buffers.append(buffer)
+
+    @contextlib.contextmanager
+    def buffer(self, size: int) -> Iterator[bytearray]:
+        buffer = self.acquire(size)
+        try:
+            yield buffer
+        finally:
+            self.release(buffer)
+
+
+buffer_pool = BufferPool()
+
+
+DEFAULT_PAGE_SIZE = 0x1000  # 4KB
+
+
+class RemoteMemoryView:
+    """A read-only view of remote memory which is indexed and sliced like
+    `bytes` (relative to `base`), but only fetches the pages it touches. Pages
+    are kept in an LRU cache, optionally reading ahead on a miss."""
+
+    __slots__ = (
+        "base",
+        "size",
+        "page_size",
+        "cache_pages",
+        "read_ahead",
+        "_read",
+        "_pages",
+    )
+
+    def __init__(
+        self,
+        read: MemoryReader,
+        base: int,
+        size: int,
+        page_size: int = DEFAULT_PAGE_SIZE,
+        cache_pages: int = 64,
+        read_ahead: int = 0,
+    ) -> None:
+        self.base = base
+        self.size = size
+        self.page_size = page_size
+        self.cache_pages = cache_pages
+        # The number of pages after a missed one to fetch in the same read.
+        self.read_ahead = read_ahead
+        self._read = read
+        self._pages: collections.OrderedDict[int, bytes] = collections.OrderedDict()
+
+    def __repr__(self) -> str:
+        return (
+            f"RemoteMemoryView(base={self.base:#x}, size={self.size:#x}, "
+            f"cached_pages={len(self._pages)})"
+        )
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, key: int | slice) -> int | bytes:
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.size)
+            if step != 1:
+                return self[start:stop][::step]
+
+            return self._read_range(start, stop)
+
+        if key < 0:
+            key += self.size
+
+        if not 0 <= key < self.size:
+            raise IndexError("RemoteMemoryView index out of range")
+
+        page_index, page_offset = divmod(key, self.page_size)
+        return self._page(page_index)[page_offset]
+
+    def _read_range(self, start: int, stop: int) -> bytes:
+        if start >= stop:
+            return b""
+
+        first_page = start // self.page_size
+        last_page = (stop - 1) // self.page_size
+
+        data = b"".join(self._page(index) for index in range(first_page, last_page + 1))
+        offset = start - first_page * self.page_size
+        return data[offset : offset + stop - start]
+
+    def _page(self, index: int) -> bytes:
+        page = self._pages.get(index)
+        if page is not None:
+            self._pages.move_to_end(index)
+            return page
+
+        # Fetch the missed page and any read ahead in a single read.
+        start = index * self.page_size
+        end = min(start + (1 + self.read_ahead) * self.page_size, self.size)
+        data = self._read(self.base + start, end - start)
+
+        for offset in range(0, len(data), self.page_size):
+            self._pages[index + offset // self.page_size] = data[
+                offset : offset + self.page_size
+            ]
+            self._pages.move_to_end(index + offset // self.page_size)
+
+        while len(self._pages) > self.cache_pages:
+            self._pages.popitem(last=False)
+
+        return data[: self.page_size]
+
+
+def signature_scan_chunked(
+    read: MemoryReader,
+    address: int,
+    size: int,
+    signature: Signature,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> int | None:
+    """Scans `size` bytes starting at `address` for a signature, holding at most
+    `chunk_size` bytes in memory at once. Stops at the first match, returning its
+    offset relative to `address`."""
+
+    return signature_scan_chunked_into(
+        reader_into(read),
+        address,
+        size,
+        signature,
+        chunk_size,
+    )
+
+
+def iter_signature_matches_chunked_into(
+    read_into: MemoryIntoReader,
+    address: int,
+    size: int,
+    signature: Signature,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Generator[int, None, None]:
+    """Lazily yields the offset (relative to `address`) of every match in the
+    `size` bytes starting at `address`, reading a chunk at a time into a single
+    pooled buffer. Overlapping matches are included."""
+
+    if chunk_size < len(signature):
+        raise ValueError("Chunk size must be at least the length of the signature.")
+
+    func = signature.compile()
+    # Consecutive chunks overlap so a match spanning a boundary is not missed.
+    overlap = len(signature) - 1
+    offset = 0
+
+    with buffer_pool.buffer(min(chunk_size, size)) as buffer:
+        view = memoryview(buffer)
+
+        try:
+            while offset < size:
+                length = min(chunk_size, size - offset)
+                bytes_read = read_into(address + offset, view[:length])
+                if bytes_read < len(signature):
+                    break
+
+                # Matches must fit within the chunk, so those in the overlap are
+                # only found in the next one.
+                start = 0
+                while (res := func(buffer, start, bytes_read)) is not None:
+                    yield offset + res
+                    start = res + 1
+
+                offset += bytes_read - overlap
+        finally:
+            view.release()
+
+
+def signature_scan_chunked_into(
+    read_into: MemoryIntoReader,
+    address: int,
+    size: int,
+    signature: Signature,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> int | None:
+    """Equivalent to `signature_scan_chunked`, but reading each chunk into a
+    single pooled buffer which is then scanned in place."""
+
+    start_time = time.perf_counter()
+    with contextlib.closing(
+        iter_signature_matches_chunked_into(
+            read_into,
+            address,
+            size,
+            signature,
+            chunk_size,
+        ),
+    ) as matches:
+        res = next(matches, None)
+
+    if res is None:
+        return None
+
+    time_taken = time.perf_counter() - start_time
+    logger.debug(
+        f"Scanning signature {signature!r} took {utils.human_readable_time(time_taken)}. "
+        f"Scanned {utils.human_readable_bytes(res)} ({(res/size) * 100:.2f}% of region) "
+        f"in chunks of {utils.human_readable_bytes(chunk_size)}.",
+    )
+    return res
+
+
+# What a search starting from a hint returns when there are several matches.
+SCAN_FIRST = "first"  # The lowest offset, same as a scan from the start.
+SCAN_NEAREST = "nearest"  # The closest to the hint, the lower one on ties.
+
+# The distance either side of the hint searched first, doubling until a match
+# is found.
+DEFAULT_HINT_WINDOW = 0x10000  # 64KB
+
+# Finds the first match starting within `[start, end)`, or the last one if the
+# third argument is set.
+RangeScanner = Callable[[int, int, bool], Union[int, None]]
+
+
+def _range_scanner(
+    func: SignatureFunction,
+    buffer: Buffer,
+    base: int,
+    size: int,
+    length: int,
+) -> RangeScanner:
+    """Adapts a scanner to search the `size` bytes at `base` of a buffer, with
+    offsets relative to `base`."""
+
+    def scan_range(start: int, end: int, last: bool = False) -> int | None:
+        # Matches starting before `end` may extend past it.
+        scan_end = base + min(end + length - 1, size)
+        res = func(buffer, base + start, scan_end)
+
+        if last:
+            while (
+                res is not None
+                and (next_res := func(buffer, res + 1, scan_end)) is not None
+            ):
+                res = next_res
+
+        return None if res is None else res - base
+
+    return scan_range
+
+
+def _scan_outward(
+    scan_range: RangeScanner,
+    size: int,
+    length: int,
+    hint: int,
+    mode: str,
+    window: int,
+    max_distance: int | None,
+    unique: bool = False,
+) -> int | None:
+    """Searches for a match in windows growing outwards from the hint, stopping
+    at the first window with one. Gives up once matches further than
+    `max_distance` from the hint would have to be searched. If `unique` is set,
+    raises `AmbiguousSignatureError` if the match is not the only one within
+    `max_distance` of the hint."""
+
+    if mode not in (SCAN_FIRST, SCAN_NEAREST):
+        raise ValueError(f"Unknown scan mode {mode!r}.")
+
+    # The window doubles in size each time, which a zero one never would.
+    if window <= 0:
+        raise ValueError("The window must be positive.")
+
+    # The offsets a match may start at.
+    starts = size - length + 1
+    if starts <= 0:
+        return None
+
+    hint = min(max(hint, 0), starts)
+    if max_distance is None:
+        max_distance = max(hint, starts - hint)
+
+    low = high = hint
+    radius = min(window, max_distance)
+
+    while low > 0 or high < starts:
+        new_low = max(hint - radius, 0)
+        new_high = min(hint + radius, starts)
+
+        # The last match in the window to the left is the closest to the hint.
+        left = scan_range(new_low, low, mode == SCAN_NEAREST) if new_low < low else None
+        right = scan_range(high, new_high, False) if high < new_high else None
+        low, high = new_low, new_high
+
+        if left is not None or right is not None:
+            if mode == SCAN_FIRST:
+                # Everything before the window is yet to be searched.
+                if low > 0 and (earlier := scan_range(0, low, False)) is not None:
+                    res = earlier
+                else:
+                    res = left if left is not None else right
+            elif left is None or (right is not None and right - hint < hint - left):
+                res = right
+            else:
+                res = left
+
+            if unique:
+                _check_unique_near(
+                    scan_range,
+                    res,
+                    max(hint - max_distance, 0),
+                    min(hint + max_distance, starts),
+                )
+
+            return res
+
+        if radius >= max_distance:
+            break
+
+        radius = min(radius * 2, max_distance)
+
+    return None
+
+
+def _check_unique_near(scan_range: RangeScanner, res: int, low: int, high: int) -> None:
+    """Raises `AmbiguousSignatureError` if there is another match starting
+    within `[low, high)`."""
+
+    other = scan_range(low, res, False) if low < res else None
+    if other is None and res + 1 < high:
+        other = scan_range(res + 1, high, False)
+
+    if other is not None:
+        raise AmbiguousSignatureError(min(res, other), max(res, other))
+
+
+def signature_scan_near(
+    buffer: Buffer,
+    signature: Signature,
+    hint: int,
+    mode: str = SCAN_NEAREST,
+    window: int = DEFAULT_HINT_WINDOW,
+    max_distance: int | None = None,
+    unique: bool = False,
+) -> int | None:
+    """Scans a buffer for a signature, starting from where it is expected to
+    be (eg. where it was in the last version of a module) and searching
+    outwards. Finds matches close to the hint without scanning everything
+    before them. If `unique` is set, raises `AmbiguousSignatureError` unless
+    the match is the only one within `max_distance` of the hint."""
+
+    func = _get_scanner(buffer, signature)
+    scan_range = _range_scanner(func, buffer, 0, len(buffer), len(signature))
+
+    return _scan_outward(
+        scan_range,
+        len(buffer),
+        len(signature),
+        hint,
+        mode,
+        window,
+        max_distance,
+        unique,
+    )
+
+
+def signature_scan_chunked_into_near(
+    read_into: MemoryIntoReader,
+    address: int,
+    size: int,
+    signature: Signature,
+    hint: int,
+    mode: str = SCAN_NEAREST,
+    window: int = DEFAULT_HINT_WINDOW,
+    max_distance: int | None = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    unique: bool = False,
+) -> int | None:
+    """Equivalent to `signature_scan_near` over the `size` bytes starting at
+    `address`, only reading the windows searched. Returns the offset relative
+    to `address`."""
+
+    length = len(signature)
+
+    def scan_range(start: int, end: int, last: bool = False) -> int | None:
+        # Each window is only read once, even when its last match is wanted.
+        with contextlib.closing(
+            iter_signature_matches_chunked_into(
+                read_into,
+                address + start,
+                min(end + length - 1, size) - start,
+                signature,
+                chunk_size,
+            ),
+        ) as matches:
+            res = next(matches, None)
+
+            if last and res is not None:
+                for res in matches:
+                    pass
+
+        return None if res is None else start + res
+
+    return _scan_outward(
+        scan_range,
+        size,
+        length,
+        hint,
+        mode,
+        window,
+        max_distance,
+        unique,
+    )
+
+
+# Each worker gets several stripes so that once a match is found, the stripes
+# after it are still queued and can be cancelled rather than scanned.
+STRIPES_PER_WORKER = 4
+
+
+def _scan_stripe(
+    shared_name: str,
+    start: int,
+    end: int,
+    scan_end: int,
+    pattern: tuple[int | None, ...],
+    limit: int | None,
+) -> list[int]:
+    """Finds up to `limit` matches starting within `[start, end)` of a shared
+    memory block inside a worker process. Matches may extend up to `scan_end`."""
+
+    matches = []
+
+    shared = shared_memory.SharedMemory(name=shared_name)
+    try:
+        stripe = shared.buf[start:scan_end]
+        # The regex engine works on the shared buffer directly, where the exec
+        # engine would need a copy of the stripe for `bytes.index`.
+        func = Signature(*pattern).compile(ENGINE_REGEX)
+
+        offset = 0
+        while limit is None or len(matches) < limit:
+            res = func(stripe, offset)
+            # Matches starting in the overlap belong to the next stripe.
+            if res is None or res >= end - start:
+                break
+
+            matches.append(start + res)
+            offset = res + 1
+
+        stripe.release()
+    finally:
+        shared.close()
+
+    return matches
+
+
+def iter_signature_matches_shared(
+    shared: shared_memory.SharedMemory,
+    size: int,
+    signature: Signature,
+    workers: int | None = None,
+    limit: int | None = None,
+) -> Generator[int, None, None]:
+    """Yields the offsets of up to `limit` matches in the first `size` bytes of
+    a shared memory block, in order, found across a pool of processes. Closing
+    the generator cancels the stripes not yet scanned."""
+
+    workers = workers or os.cpu_count() or 1
+    stripe_count = workers * STRIPES_PER_WORKER
+    stripe_size = max(-(-size // stripe_count), len(signature))
+    # Stripes overlap so a match spanning a boundary is not missed.
+    overlap = len(signature) - 1
+
+    pool = ProcessPoolExecutor(workers)
+    try:
+        futures = [
+            pool.submit(
+                _scan_stripe,
+                shared.name,
+                start,
+                min(start + stripe_size, size),
+                min(start + stripe_size + overlap, size),
+                signature.pattern,
+                limit,
+            )
+            for start in range(0, size, stripe_size)
+        ]
+
+        # Stripes are collected in order, so matches are yielded lowest first.
+        found = 0
+        for future in futures:
+            for res in future.result():
+                yield res
+
+                found += 1
+                if found == limit:
+                    return
+    finally:
+        # Only the stripes already being scanned are waited for, so the block
+        # is not unlinked from under them.
+        pool.shutdown(cancel_futures=True)
+
+
+def signature_scan_shared(
+    shared: shared_memory.SharedMemory,
+    size: int,
+    signature: Signature,
+    workers: int | None = None,
+) -> int | None:
+    """Scans the first `size` bytes of a shared memory block across a pool of
+    processes. Gives the same result as a serial scan of the same bytes."""
+
+    workers = workers or os.cpu_count() or 1
+
+    start_time = time.perf_counter()
+    with contextlib.closing(
+        iter_signature_matches_shared(shared, size, signature, workers, limit=1),
+    ) as matches:
+        res = next(matches, None)
+
+    if res is None:
+        return None
+
+    time_taken = time.perf_counter() - start_time
+    logger.debug(
+        f"Scanning signature {signature!r} across {workers} workers took "
+        f"{utils.human_readable_time(time_taken)}.",
+    )
+    return res
+
+
+def signature_scan_parallel(
+    buffer: bytes,
+    signature: Signature,
+    workers: int | None = None,
+) -> int | None:
+    """Scans a buffer for a signature using a pool of processes. A worker count
+    of `None` uses every available core."""
+
+    if workers == 1 or len(buffer) < len(signature):
+        return signature_scan(buffer, signature)
+
+    shared = shared_memory.SharedMemory(create=True, size=len(buffer))
+    try:
+        shared.buf[: len(buffer)] = buffer
+        return signature_scan_shared(shared, len(buffer), signature, workers)
+    finally:
+        shared.close()
+        shared.unlink()
+
+
+def iter_signature_matches_parallel_into(
+    read_into: MemoryIntoReader,
+    address: int,
+    size: int,
+    signature: Signature,
+    workers: int | None = None,
+    limit: int | None = None,
+) -> Generator[int, None, None]:
+    """Equivalent to `iter_signature_matches_shared` over the `size` bytes
+    starting at `address`, read straight into the shared memory block rather
+    than copying an existing buffer into it. Yields offsets relative to
+    `address`."""
+
+    if size < len(signature):
+        return
+
+    shared = shared_memory.SharedMemory(create=True, size=size)
+    try:
+        view = shared.buf[:size]
+        try:
+            bytes_read = read_into(address, view)
+        finally:
+            view.release()
+
+        with contextlib.closing(
+            iter_signature_matches_shared(
+                shared,
+                bytes_read,
+                signature,
+                workers,
+                limit,
+            ),
+        ) as matches:
+            yield from matches
+    finally:
+        shared.close()
+        shared.unlink()
+
+
+class AmbiguousSignatureError(Exception):
+    """Raised when a signature expected to match once matches several times."""
+
+    def __init__(self, first: int, second: int) -> None:
+        super().__init__(f"Matched at both {first:#x} and {second:#x}.")
+        self.first = first
+        self.second = second
+
+
+def find_unique(matches: Generator[int, None, None]) -> int | None:
+    """Returns the only match yielded, or `None` if there are none. Raises
+    `AmbiguousSignatureError` as soon as a second one is yielded, without
+    scanning any further."""
+
+    with contextlib.closing(matches):
+        first = next(matches, None)
+        if first is None:
+            return None
+
+        second = next(matches, None)
+        if second is not None:
+            raise AmbiguousSignatureError(first, second)
+
+        return first
+
+
 def signature_match(buffer: bytes, signature: Signature) -> bool:
     """Returns whether a buffer EXACTLY matches a signature.
     Unoptimised for frequent use."""
@@ -88,22 +874,238 @@ def signature_match(buffer: bytes, signature: Signature) -> bool:
     return True
 
 
+def _signature_regex(signature: Signature) -> bytes:
+    """Converts a signature into the source of an equivalent bytes regex."""
+
+    return b"".join(
+        b"." if byte is None else re.escape(bytes((byte,)))
+        for byte in signature.pattern
+    )
+
+
+# Enough to contain the DOS, COFF and optional headers and the section table of
+# any module we scan.
+PE_HEADER_SIZE = 0x1000
+
+# e_magic, e_lfanew
+_DOS_HEADER = struct.Struct("<2s58xI")
+# Signature, NumberOfSections, TimeDateStamp, SizeOfOptionalHeader
+_NT_HEADERS = struct.Struct("<4s2xHI8xH2x")
+# SizeOfImage, CheckSum
+_OPTIONAL_HEADER = struct.Struct("<56xI4xI")
+# Name, VirtualSize, VirtualAddress, SizeOfRawData, PointerToRawData, Characteristics
+_SECTION_HEADER = struct.Struct("<8sIIII12xI")
+
+IMAGE_SCN_MEM_EXECUTE = 0x20000000
+
+
+class PESection(NamedTuple):
+    name: str
+    virtual_address: int
+    virtual_size: int
+    raw_offset: int
+    raw_size: int
+    characteristics: int
+
+    @property
+    def is_executable(self) -> bool:
+        return bool(self.characteristics & IMAGE_SCN_MEM_EXECUTE)
+
+    @property
+    def size(self) -> int:
+        """The size of the section once loaded into memory."""
+
+        return self.virtual_size or self.raw_size
+
+
+class PEHeader(NamedTuple):
+    timestamp: int
+    image_size: int
+    checksum: int
+    sections: tuple[PESection, ...]
+
+    def find_section(self, rva: int) -> PESection | None:
+        """Returns the section containing an RVA."""
+
+        for section in self.sections:
+            if section.virtual_address <= rva < section.virtual_address + section.size:
+                return section
+
+        return None
+
+    def file_offset_to_rva(self, offset: int) -> int | None:
+        """Translates an offset within the file on disk to an RVA within the
+        loaded image."""
+
+        for section in self.sections:
+            if section.raw_offset <= offset < section.raw_offset + section.raw_size:
+                return section.virtual_address + offset - section.raw_offset
+
+        return None
+
+
+def parse_pe_header(buffer: bytes) -> PEHeader:
+    """Parses the identifying fields and section table from the headers of a
+    PE image, either on disk or loaded in memory."""
+
+    magic, nt_offset = _DOS_HEADER.unpack_from(buffer, 0)
+    if magic != b"MZ":
+        raise ValueError("Buffer does not start with a DOS header.")
+
+    signature, section_count, timestamp, optional_size = _NT_HEADERS.unpack_from(
+        buffer,
+        nt_offset,
+    )
+    if signature != b"PE\0\0":
+        raise ValueError("Buffer does not contain a PE header.")
+
+    optional_offset = nt_offset + _NT_HEADERS.size
+    image_size, checksum = _OPTIONAL_HEADER.unpack_from(buffer, optional_offset)
+
+    sections = []
+    section_offset = optional_offset + optional_size
+    for _ in range(section_count):
+        (
+            name,
+            virtual_size,
+            virtual_address,
+            raw_size,
+            raw_offset,
+            characteristics,
+        ) = _SECTION_HEADER.unpack_from(buffer, section_offset)
+        section_offset += _SECTION_HEADER.size
+
+        sections.append(
+            PESection(
+                name=name.rstrip(b"\0").decode(errors="replace"),
+                virtual_address=virtual_address,
+                virtual_size=virtual_size,
+                raw_offset=raw_offset,
+                raw_size=raw_size,
+                characteristics=characteristics,
+            ),
+        )
+
+    return PEHeader(
+        timestamp=timestamp,
+        image_size=image_size,
+        checksum=checksum,
+        sections=tuple(sections),
+    )
+
+
+def get_scan_sections(header: PEHeader, signature: Signature) -> list[PESection]:
+    """Returns the sections of a module that a signature should be searched for
+    in, ordered by address."""
+
+    if signature.sections is None:
+        sections = [section for section in header.sections if section.is_executable]
+    else:
+        sections = [
+            section for section in header.sections if section.name in signature.sections
+        ]
+
+    return sorted(sections, key=lambda section: section.virtual_address)
+
+
+def map_file(path: str) -> mmap.mmap:
+    """Maps a file on disk read-only into memory."""
+
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _iter_pe_file_matches(
+    image: Buffer,
+    header: PEHeader,
+    sections: list[PESection],
+    func: SignatureFunction,
+) -> Generator[int, None, None]:
+    for section in sections:
+        start = section.raw_offset
+        end = section.raw_offset + section.raw_size
+
+        while (offset := func(image, start, end)) is not None:
+            yield header.file_offset_to_rva(offset)
+            start = offset + 1
+
+
+def signature_scan_pe_file(
+    path: str,
+    signature: Signature,
+    hint: int | None = None,
+    max_distance: int | None = None,
+    unique: bool = False,
+) -> int | None:
+    """Scans a PE file on disk for a signature without reading it into memory,
+    returning the RVA the match will have once the module is loaded. Given the
+    RVA it is expected at, the section containing it is searched outwards from
+    there first, for the nearest match within `max_distance`. Otherwise, the
+    whole file is scanned. If `unique` is set, the match must be the only one
+    within `max_distance` of the hint, or in the whole file when scanned (see
+    `find_unique`), else `AmbiguousSignatureError` is raised."""
+
+    # `mmap` lacks `index`, but the regex engine scans it in place.
+    func = signature.compile(ENGINE_REGEX)
+
+    with map_file(path) as image:
+        header = parse_pe_header(image)
+        sections = get_scan_sections(header, signature)
+
+        section = header.find_section(hint) if hint is not None else None
+        if section in sections:
+            scan_range = _range_scanner(
+                func,
+                image,
+                section.raw_offset,
+                section.raw_size,
+                len(signature),
+            )
+            res = _scan_outward(
+                scan_range,
+                section.raw_size,
+                len(signature),
+                hint - section.virtual_address,
+                SCAN_NEAREST,
+                DEFAULT_HINT_WINDOW,
+                max_distance,
+                unique,
+            )
+            if res is not None:
+                return section.virtual_address + res
+
+        matches = _iter_pe_file_matches(image, header, sections, func)
+        if unique:
+            return find_unique(matches)
+
+        with contextlib.closing(matches):
+            return next(matches, None)
+
+
 # Mum can we have a JIT?
 # No we have a JIT at home.
 # The JIT at home:
-SignatureFunction = Callable[[bytes], int | None]
+# Scanners take the buffer and optionally a `[start, end)` range to restrict
+# the search to, returning the offset of the match within the whole buffer.
+SignatureFunction = Callable[..., int | None]
 
 PARTIAL_SCAN_BASE_FUNCTION = """
-def _sig_scan(buffer: bytes) -> int | None:
+def _sig_scan(buffer: bytes, start: int = 0, end: int | None = None) -> int | None:
     byte_sequence = {byte_sequence}
     sequence_offset = {sequence_offset}
     signature_length = {signature_length}
-    offset = -signature_length
+    if end is None:
+        end = len(buffer)
+    last_offset = end - signature_length
+    initial_offset = start + sequence_offset - 1
     try:
         while True:
-            initial_offset = buffer.index(byte_sequence, offset + signature_length)
+            initial_offset = buffer.index(byte_sequence, initial_offset + 1, end)
             offset = initial_offset - sequence_offset
 
+            if offset > last_offset:
+                return None
+
             if (
                 {conditions}
             ):
@@ -115,50 +1117,143 @@ def _sig_scan(buffer: bytes) -> int | None:
 """
 
 COMPLETE_SCAN_BASE_FUNCTION = """
-def _sig_scan(buffer: bytes) -> int | None:
+def _sig_scan(buffer: bytes, start: int = 0, end: int | None = None) -> int | None:
+    if end is None:
+        end = len(buffer)
     try:
-        return buffer.index({byte_sequence})
+        return buffer.index({byte_sequence}, start, end)
     except ValueError:
         return None
 """
 
 
-def compile_signature(signature: Signature) -> SignatureFunction:
-    """Compiles a signature into a Python function."""
+# A rough model of how often each byte appears in x86-64 code, used to pick
+# the anchors least likely to produce false candidates. Anything not listed
+# shares what is left over evenly.
+_COMMON_X86_64_BYTES = {
+    0x00: 0.120,
+    0x48: 0.050,
+    0xFF: 0.040,
+    0x8B: 0.040,
+    0xCC: 0.030,
+    0x89: 0.030,
+    0x24: 0.020,
+    0x0F: 0.020,
+    0xE8: 0.020,
+    0x8D: 0.015,
+    0x44: 0.015,
+    0x4C: 0.015,
+    0x83: 0.015,
+    0x01: 0.012,
+    0x05: 0.010,
+    0x08: 0.010,
+    0x10: 0.010,
+    0x20: 0.010,
+    0x40: 0.010,
+    0x74: 0.010,
+    0x85: 0.010,
+    0xC0: 0.010,
+    0xC3: 0.010,
+    0x41: 0.010,
+    0x49: 0.008,
+    0x15: 0.006,
+}
 
-    if None in signature.pattern:  # Partial Scan
-        # Find the largest sequence of constant bytes in the signature.
-        max_sequence = [-1, b""]
-        current_sequence = [-1, b""]
+X86_64_BYTE_FREQUENCIES = tuple(
+    _COMMON_X86_64_BYTES.get(
+        byte,
+        (1 - sum(_COMMON_X86_64_BYTES.values())) / (256 - len(_COMMON_X86_64_BYTES)),
+    )
+    for byte in range(256)
+)
 
-        for i, byte in enumerate(signature.pattern):
-            if byte is None:
-                if len(current_sequence[1]) > len(max_sequence[1]):
-                    max_sequence = current_sequence
-                current_sequence = [-1, b""]
-                continue
 
-            if current_sequence[0] == -1:
-                current_sequence[0] = i
-                current_sequence[1] = bytes([byte])
+def _constant_runs(signature: Signature) -> list[tuple[int, bytes]]:
+    """Splits a signature into its runs of constant bytes and their offsets."""
 
-            else:
-                current_sequence[1] += bytes([byte])
+    runs = []
+    run_start = None
+
+    for i, byte in enumerate((*signature.pattern, None)):
+        if byte is None:
+            if run_start is not None:
+                runs.append((run_start, bytes(signature.pattern[run_start:i])))
+                run_start = None
+            continue
+
+        if run_start is None:
+            run_start = i
+
+    return runs
+
+
+# Rough costs in nanoseconds, measured on CPython 3.11, used to weigh anchors
+# against each other. `bytes.index` uses `memchr` for single bytes, which is far
+# faster than its search for longer sequences. That search gets faster the longer
+# the sequence is, and slower the more common its last byte is (as it is checked
+# first). Every hit of the anchor is then checked in Python.
+_SINGLE_BYTE_INDEX_COST = 0.1  # Per byte scanned.
+_SEQUENCE_INDEX_COST = 0.7  # Per byte scanned.
+_SEQUENCE_LENGTH_COST = 1.5  # Per byte scanned, divided by the sequence length.
+_LAST_BYTE_COST = 8.0  # Per byte scanned, scaled by the last byte's frequency.
+_CANDIDATE_COST = 1000.0  # Per anchor hit.
+
+
+def _anchor_cost(sequence: bytes, frequencies: tuple[float, ...]) -> float:
+    """Estimates the cost per byte scanned of anchoring on a sequence."""
+
+    expected_hits = math.prod(frequencies[byte] for byte in sequence)
+
+    if len(sequence) == 1:
+        index_cost = _SINGLE_BYTE_INDEX_COST
+    else:
+        index_cost = (
+            _SEQUENCE_INDEX_COST
+            + _SEQUENCE_LENGTH_COST / len(sequence)
+            + _LAST_BYTE_COST * frequencies[sequence[-1]]
+        )
+
+    return index_cost + expected_hits * _CANDIDATE_COST
+
+
+def generate_signature_source(
+    signature: Signature,
+    frequencies: tuple[float, ...] = X86_64_BYTE_FREQUENCIES,
+) -> str:
+    """Generates the source code of the exec engine's scanner for a signature."""
+
+    if None in signature.pattern:  # Partial Scan
+        # Anchor on the run of constant bytes expected to be cheapest to scan
+        # for, which is mostly down to how rarely it occurs, as every false hit
+        # of the anchor is checked in Python.
+        runs = sorted(
+            _constant_runs(signature),
+            key=lambda run: (_anchor_cost(run[1], frequencies), -len(run[1])),
+        )
+        sequence_offset, byte_sequence = runs[0]
 
         # Conditions
         conditions = []
-        for i, byte in enumerate(signature.pattern):
-            if byte is None:
-                continue
 
-            conditions.append(f"buffer[offset + {i}] == {byte}")
+        # The next rarest run rules out most remaining false hits in one
+        # comparison.
+        if len(runs) > 1:
+            second_offset, second_sequence = runs[1]
+            conditions.append(
+                f"buffer[offset + {second_offset} : offset + {second_offset + len(second_sequence)}]"
+                f" == {second_sequence}",
+            )
+
+        for run_offset, sequence in runs[2:]:
+            for i, byte in enumerate(sequence, run_offset):
+                conditions.append(f"buffer[offset + {i}] == {byte}")
 
-        condition_str = " and ".join(conditions)
+        condition_str = " and ".join(conditions) or "True"
 
         # Compile the function.
         func_str = PARTIAL_SCAN_BASE_FUNCTION.format(
-            byte_sequence=max_sequence[1],
-            sequence_offset=max_sequence[0],
+            byte_sequence=byte_sequence,
+            sequence_offset=sequence_offset,
             signature_length=len(signature),
             conditions=condition_str,
         )
@@ -167,7 +1262,185 @@ def compile_signature(signature: Signature) -> SignatureFunction:
         byte_sequence = bytes(signature.pattern)
         func_str = COMPLETE_SCAN_BASE_FUNCTION.format(byte_sequence=repr(byte_sequence))
 
+    return func_str
+
+
+def compile_signature(
+    signature: Signature,
+    engine: str = ENGINE_EXEC,
+    frequencies: tuple[float, ...] = X86_64_BYTE_FREQUENCIES,
+) -> SignatureFunction:
+    """Compiles a signature into a Python function."""
+
+    if engine == ENGINE_NUMPY:
+        if (numpy_func := _compile_numpy_signature(signature, frequencies)) is not None:
+            return numpy_func
+
+        # Like NumPy, the regex engine scans any buffer (eg. a `memoryview`),
+        # which the exec engine does not.
+        engine = ENGINE_REGEX
+
+    if engine == ENGINE_REGEX:
+        return _compile_regex_signature(signature)
+
+    if engine != ENGINE_EXEC:
+        raise ValueError(f"Unknown signature engine {engine!r}.")
+
     out_vars = {}
 
-    exec(func_str, {}, out_vars)
+    exec(generate_signature_source(signature, frequencies), {}, out_vars)
     return out_vars["_sig_scan"]
+
+
+def _compile_regex_signature(signature: Signature) -> SignatureFunction:
+    """Compiles a signature into a function backed by a bytes regex, so that
+    wildcard matching never drops back into Python per candidate."""
+
+    search = re.compile(_signature_regex(signature), re.DOTALL).search
+
+    def _sig_scan(buffer: bytes, start: int = 0, end: int | None = None) -> int | None:
+        if end is None:
+            end = len(buffer)
+
+        match = search(buffer, start, end)
+        if match is None:
+            return None
+
+        return match.start()
+
+    return _sig_scan
+
+
+# How many candidate offsets the NumPy engine compares at once. Chunks start
+# small so that early matches are found quickly, and double up to a size big
+# enough to keep the per chunk overhead negligible and small enough for the
+# masks to stay in cache.
+NUMPY_MIN_CHUNK_SIZE = 0x1000  # 4KB
+NUMPY_CHUNK_SIZE = 0x40000  # 256KB
+
+
+def _numpy_constants(
+    signature: Signature,
+    frequencies: tuple[float, ...],
+) -> list[tuple[int, int]]:
+    """Returns the offsets and values of the signature's constant bytes, rarest
+    first."""
+
+    return sorted(
+        (
+            (offset, byte)
+            for offset, byte in enumerate(signature.pattern)
+            if byte is not None
+        ),
+        key=lambda constant: frequencies[constant[1]],
+    )
+
+
+def _numpy_matches(
+    buffer: Buffer,
+    constants: list[tuple[int, int]],
+    length: int,
+    start: int,
+    end: int,
+) -> Iterator[int]:
+    """Yields the offsets of every match within `[start, end)`, a chunk of
+    candidates at a time."""
+
+    import numpy as np
+
+    array = np.frombuffer(buffer, dtype=np.uint8)
+    candidates_end = end - length + 1
+
+    # Reused across chunks, so comparisons do not allocate.
+    mask = np.empty(NUMPY_CHUNK_SIZE, dtype=np.bool_)
+    equal = np.empty(NUMPY_CHUNK_SIZE, dtype=np.bool_)
+
+    chunk_start = start
+    chunk_size = NUMPY_MIN_CHUNK_SIZE
+
+    while chunk_start < candidates_end:
+        count = min(chunk_size, candidates_end - chunk_start)
+        chunk_offset = chunk_start
+
+        chunk_start += count
+        chunk_size = min(chunk_size * 2, NUMPY_CHUNK_SIZE)
+
+        if not constants:
+            yield from range(chunk_offset, chunk_offset + count)
+            continue
+
+        chunk_mask = mask[:count]
+        chunk_equal = equal[:count]
+
+        # Candidates are where the byte at each constant's offset is equal to
+        # it, for every constant.
+        offset, byte = constants[0]
+        np.equal(
+            array[chunk_offset + offset : chunk_offset + offset + count],
+            byte,
+            out=chunk_mask,
+        )
+
+        # The rarest byte is compared first, as most chunks end right there.
+        if not chunk_mask.any():
+            continue
+
+        for offset, byte in constants[1:]:
+            np.equal(
+                array[chunk_offset + offset : chunk_offset + offset + count],
+                byte,
+                out=chunk_equal,
+            )
+            np.logical_and(chunk_mask, chunk_equal, out=chunk_mask)
+
+        for offset in np.flatnonzero(chunk_mask).tolist():
+            yield chunk_offset + offset
+
+
+def _has_numpy() -> bool:
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        return False
+
+    return True
+
+
+def _compile_numpy_signature(
+    signature: Signature,
+    frequencies: tuple[float, ...] = X86_64_BYTE_FREQUENCIES,
+) -> SignatureFunction | None:
+    """Compiles a signature into a function comparing whole chunks of the
+    buffer against each of its constant bytes at once. Returns `None` if NumPy
+    is not installed."""
+
+    if not _has_numpy():
+        logger.debug("NumPy is not installed. Using the regex engine instead.")
+        return None
+
+    constants = _numpy_constants(signature, frequencies)
+    length = len(signature)
+
+    def _sig_scan(buffer: Buffer, start: int = 0, end: int | None = None) -> int | None:
+        if end is None:
+            end = len(buffer)
+
+        return next(_numpy_matches(buffer, constants, length, start, end), None)
+
+    return _sig_scan
+
+
+def signature_scan_all(buffer: Buffer, signature: Signature) -> list[int]:
+    """Finds the offsets of every match of a signature in a buffer, including
+    overlapping ones."""
+
+    if _has_numpy():
+        constants = _numpy_constants(signature, X86_64_BYTE_FREQUENCIES)
+        return list(
+            _numpy_matches(buffer, constants, len(signature), 0, len(buffer)),
+        )
+
+    # A lookahead makes the match zero-width, so overlapping matches are all
+    # visited.
+    regex = re.compile(b"(?=" + _signature_regex(signature) + b")", re.DOTALL)
+    return [match.start() for match in regex.finditer(buffer)]
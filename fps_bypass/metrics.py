@@ -0,0 +1,244 @@
+# Runtime metrics, optionally served over HTTP in the Prometheus text format.
+from __future__ import annotations
+
+import bisect
+import threading
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+# Suited to both memory accesses (microseconds) and corrections (up to the
+# maximum enforcement interval).
+DEFAULT_BUCKETS = (
+    0.00001,
+    0.00005,
+    0.0001,
+    0.0005,
+    0.001,
+    0.005,
+    0.01,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 9370
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    __slots__ = (
+        "name",
+        "help",
+        "_value",
+        "_lock",
+    )
+
+    def __init__(self, name: str, help: str) -> None:
+        self.name = name
+        self.help = help
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"Counter({self.name}={self._value})"
+
+    @property
+    def value(self) -> int:
+        return self._value
+
+    def inc(self, amount: int = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    def render(self) -> str:
+        return (
+            f"# HELP {self.name} {self.help}\n"
+            f"# TYPE {self.name} counter\n"
+            f"{self.name} {self._value}\n"
+        )
+
+
+class Histogram:
+    __slots__ = (
+        "name",
+        "help",
+        "buckets",
+        "_counts",
+        "_sum",
+        "_count",
+        "_lock",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        # Per bucket rather than cumulative, which is only worked out on render.
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"Histogram({self.name}, count={self._count})"
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    @property
+    def sum(self) -> float:
+        return self._sum
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def render(self) -> str:
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+            count = self._count
+
+        lines = [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} histogram",
+        ]
+
+        cumulative = 0
+        for bound, bucket_count in zip((*self.buckets, float("inf")), counts):
+            cumulative += bucket_count
+            lines.append(
+                f'{self.name}_bucket{{le="{_format_value(bound)}"}} {cumulative}',
+            )
+
+        lines.append(f"{self.name}_sum {_format_value(total)}")
+        lines.append(f"{self.name}_count {count}")
+        return "\n".join(lines) + "\n"
+
+
+class Registry:
+    """Holds metrics by name, creating them on first use."""
+
+    __slots__ = (
+        "_metrics",
+        "_lock",
+    )
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, Counter | Histogram] = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name: str) -> Counter | Histogram:
+        return self._metrics[name]
+
+    def counter(self, name: str, help: str) -> Counter:
+        with self._lock:
+            metric = self._metrics.setdefault(name, Counter(name, help))
+
+        if not isinstance(metric, Counter):
+            raise ValueError(f"{name} is already registered as a histogram.")
+
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        with self._lock:
+            metric = self._metrics.setdefault(name, Histogram(name, help, buckets))
+
+        if not isinstance(metric, Histogram):
+            raise ValueError(f"{name} is already registered as a counter.")
+
+        return metric
+
+    def render(self) -> str:
+        """Renders every metric in the Prometheus text format."""
+
+        with self._lock:
+            metrics = list(self._metrics.values())
+
+        return "".join(metric.render() for metric in metrics)
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, help: str) -> Counter:
+    return REGISTRY.counter(name, help)
+
+
+def histogram(
+    name: str,
+    help: str,
+    buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+) -> Histogram:
+    return REGISTRY.histogram(name, help, buckets)
+
+
+def start_http_server(
+    port: int = DEFAULT_PORT,
+    host: str = DEFAULT_HOST,
+    registry: Registry = REGISTRY,
+) -> ThreadingHTTPServer:
+    """Serves the registry's metrics at `/metrics` from a background thread.
+    Binds to localhost by default, as the metrics are not meant to be public."""
+
+    # Imported here as most runs never serve metrics.
+    from http.server import BaseHTTPRequestHandler
+    from http.server import ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header(
+                "Content-Type",
+                "text/plain; version=0.0.4; charset=utf-8",
+            )
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        # Scrapes would otherwise be logged to stderr, over the prompt.
+        def log_message(self, format: str, *args: object) -> None:
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+
+    thread = threading.Thread(
+        target=server.serve_forever,
+        name="metrics",
+        daemon=True,
+    )
+    thread.start()
+
+    return server
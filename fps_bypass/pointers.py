@@ -0,0 +1,168 @@
+# Pointer paths, describing how to get from a signature match to what it
+# references as data rather than code.
+#
+# A path is a series of steps separated by `->`, each applied to the address
+# produced by the one before, starting from the address of the match:
+#
+#   add <n>                 Adds `n` to the address.
+#   rip32 <offset> <length> Follows the RIP relative 32-bit displacement at
+#                           `offset` into the instruction at the address, which
+#                           is `length` bytes long.
+#   deref64                 Reads the 64-bit pointer at the address. Resolution
+#                           stops if it is null.
+#   follow_jumps            Follows any chain of relative `call` or `jmp`
+#                           instructions (E8/E9) starting at the address.
+#
+# eg. "add 5 -> rip32 2 6 -> deref64 -> follow_jumps -> rip32 2 6"
+from __future__ import annotations
+
+import logging
+import struct
+from typing import Callable
+from typing import Union
+
+import memory
+
+logger = logging.getLogger("rich")
+
+STEP_SEPARATOR = "->"
+
+# Paths may lead anywhere in the process.
+ADDRESS_SPACE_SIZE = 1 << 64
+
+# `call rel32` and `jmp rel32`.
+BRANCH_OPCODES = (0xE8, 0xE9)
+BRANCH_LENGTH = 5
+
+# Beyond this, a chain of branches is assumed to be a loop (eg. code being
+# patched while it is read).
+MAX_BRANCHES = 32
+
+_INT32 = struct.Struct("<i")
+_UINT64 = struct.Struct("<Q")
+# An opcode followed by a 32-bit displacement, read together.
+_BRANCH = struct.Struct("<Bi")
+
+# Takes the view of the process' memory and an address, returning the next
+# address or `None` if it cannot be resolved (yet).
+Step = Callable[[memory.RemoteMemoryView, int], Union[int, None]]
+
+
+def _add_step(amount: int) -> Step:
+    def add(view: memory.RemoteMemoryView, address: int) -> int:
+        return address + amount
+
+    return add
+
+
+def _rip32_step(offset: int, length: int) -> Step:
+    unpack = _INT32.unpack
+
+    def rip32(view: memory.RemoteMemoryView, address: int) -> int:
+        displacement_address = address + offset
+        (displacement,) = unpack(
+            view[displacement_address : displacement_address + _INT32.size],
+        )
+        return address + length + displacement
+
+    return rip32
+
+
+def _deref64_step() -> Step:
+    unpack = _UINT64.unpack
+
+    def deref64(view: memory.RemoteMemoryView, address: int) -> int | None:
+        (pointer,) = unpack(view[address : address + _UINT64.size])
+        return pointer or None
+
+    return deref64
+
+
+def _follow_jumps_step() -> Step:
+    unpack = _BRANCH.unpack
+
+    def follow_jumps(view: memory.RemoteMemoryView, address: int) -> int | None:
+        for _ in range(MAX_BRANCHES):
+            opcode, displacement = unpack(view[address : address + _BRANCH.size])
+            if opcode not in BRANCH_OPCODES:
+                return address
+
+            address += BRANCH_LENGTH + displacement
+
+        logger.debug(f"Gave up following branches at {address:#x}.")
+        return None
+
+    return follow_jumps
+
+
+# Step names, their number of arguments and what builds them.
+_STEPS: dict[str, tuple[int, Callable[..., Step]]] = {
+    "add": (1, _add_step),
+    "rip32": (2, _rip32_step),
+    "deref64": (0, _deref64_step),
+    "follow_jumps": (0, _follow_jumps_step),
+}
+
+
+def _compile_step(text: str) -> Step:
+    name, *arguments = text.split()
+
+    if name not in _STEPS:
+        raise ValueError(f"Unknown pointer path step {name!r}.")
+
+    argument_count, make_step = _STEPS[name]
+    if len(arguments) != argument_count:
+        raise ValueError(
+            f"Pointer path step {name!r} takes {argument_count} arguments, "
+            f"got {len(arguments)}.",
+        )
+
+    return make_step(*(int(argument, 0) for argument in arguments))
+
+
+class PointerPath:
+    """A pointer path compiled into the functions carrying out each step."""
+
+    __slots__ = (
+        "source",
+        "_steps",
+    )
+
+    def __init__(self, source: str) -> None:
+        self.source = source
+        self._steps = tuple(
+            _compile_step(step) for step in source.split(STEP_SEPARATOR) if step.strip()
+        )
+
+        if not self._steps:
+            raise ValueError("Pointer paths must have at least one step.")
+
+    def __repr__(self) -> str:
+        return f"PointerPath({self.source!r})"
+
+    def __str__(self) -> str:
+        return self.source
+
+    def __eq__(self, __o: object) -> bool:
+        if not isinstance(__o, PointerPath):
+            return False
+
+        return self.source == __o.source
+
+    def __hash__(self) -> int:
+        return hash(self.source)
+
+    def resolve(self, read: memory.MemoryReader, address: int) -> int | None:
+        """Follows the path from an address, returning where it ends up or
+        `None` if a pointer along it is null."""
+
+        # Steps mostly read close to each other, so reads are made a page at a
+        # time and shared between them.
+        view = memory.RemoteMemoryView(read, 0, ADDRESS_SPACE_SIZE)
+
+        for step in self._steps:
+            address = step(view, address)
+            if address is None:
+                return None
+
+        return address
@@ -0,0 +1,456 @@
+# Backends providing access to other processes and their memory.
+from __future__ import annotations
+
+import os
+import subprocess
+import time
+from typing import Any
+from typing import Callable
+from typing import Iterable
+from typing import Protocol
+
+import winapi
+
+ModuleInfo = winapi.ModuleInfo
+ProcessCreationResult = winapi.ProcessCreationResult
+FilterLike = winapi.FilterLike
+
+
+class ProcessHandle(Protocol):
+    def close(self) -> None:
+        ...
+
+
+class ProcessBackend(Protocol):
+    """The operations on other processes which the bypass relies on. Handles
+    are opaque to everything but the backend which created them."""
+
+    def process_id_by_name(self, name: str) -> int | None:
+        ...
+
+    def process_ids_by_names(self, names: Iterable[str]) -> dict[str, list[int]]:
+        ...
+
+    def is_process_running(self, handle: Any) -> bool:
+        ...
+
+    def open_process(
+        self,
+        process_id: int,
+        memory_access: bool = False,
+    ) -> ProcessHandle:
+        """Opens a process, with access to its memory if `memory_access` is
+        set."""
+        ...
+
+    def create_process(self, path: str) -> ProcessCreationResult:
+        ...
+
+    def get_process_path(self, handle: Any) -> str:
+        ...
+
+    def get_modules(
+        self,
+        handle: Any,
+        filter: FilterLike = lambda x: True,
+    ) -> Iterable[ModuleInfo]:
+        ...
+
+    def read_memory(self, handle: Any, address: int, size: int) -> bytes:
+        ...
+
+    def read_memory_into(self, handle: Any, address: int, buffer: memoryview) -> int:
+        ...
+
+    def write_memory(self, handle: Any, address: int, data: bytes) -> None:
+        ...
+
+
+class WinAPIBackend:
+    """Accesses processes through the Windows API."""
+
+    def process_id_by_name(self, name: str) -> int | None:
+        return winapi.process_id_by_name(name)
+
+    def process_ids_by_names(self, names: Iterable[str]) -> dict[str, list[int]]:
+        return winapi.process_ids_by_names(names)
+
+    def is_process_running(self, handle: winapi.Handle) -> bool:
+        return winapi.is_process_running(handle)
+
+    def open_process(
+        self,
+        process_id: int,
+        memory_access: bool = False,
+    ) -> winapi.Handle:
+        return winapi.open_process(
+            process_id,
+            winapi.MEMORY_ACCESS if memory_access else winapi.DEFAULT_ACCESS,
+        )
+
+    def create_process(self, path: str) -> ProcessCreationResult:
+        return winapi.create_process(path)
+
+    def get_process_path(self, handle: winapi.Handle) -> str:
+        return winapi.get_process_path(handle)
+
+    def get_modules(
+        self,
+        handle: winapi.Handle,
+        filter: FilterLike = lambda x: True,
+    ) -> Iterable[ModuleInfo]:
+        return winapi.get_modules(handle, filter)
+
+    def read_memory(self, handle: winapi.Handle, address: int, size: int) -> bytes:
+        return winapi.read_memory(handle, address, size)
+
+    def read_memory_into(
+        self,
+        handle: winapi.Handle,
+        address: int,
+        buffer: memoryview,
+    ) -> int:
+        return winapi.read_memory_into(handle, address, buffer)
+
+    def write_memory(self, handle: winapi.Handle, address: int, data: bytes) -> None:
+        winapi.write_memory(handle, address, data)
+
+
+class ProcfsHandle:
+    """An open `/proc/<pid>/mem` file of a process."""
+
+    __slots__ = (
+        "process_id",
+        "_fd",
+    )
+
+    def __init__(self, process_id: int) -> None:
+        self.process_id = process_id
+
+        try:
+            self._fd = os.open(f"/proc/{process_id}/mem", os.O_RDWR)
+        except PermissionError:
+            self._fd = os.open(f"/proc/{process_id}/mem", os.O_RDONLY)
+
+    def __repr__(self) -> str:
+        return f"ProcfsHandle({self.process_id})"
+
+    def close(self) -> None:
+        if self._fd != -1:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def _executable_name(command_line: bytes) -> str:
+    # Processes run through Wine report Windows style paths.
+    executable = command_line.split(b"\0", 1)[0].decode(errors="replace")
+    return executable.replace("\\", "/").rsplit("/", 1)[-1]
+
+
+class ProcfsBackend:
+    """Accesses processes through `/proc` on Linux, for profiling and testing
+    against real processes (including ones run through Wine)."""
+
+    def process_id_by_name(self, name: str) -> int | None:
+        process_ids = self.process_ids_by_names((name,))[name]
+        return process_ids[0] if process_ids else None
+
+    def process_ids_by_names(self, names: Iterable[str]) -> dict[str, list[int]]:
+        results: dict[str, list[int]] = {name: [] for name in names}
+
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+
+            try:
+                with open(f"/proc/{entry}/cmdline", "rb") as f:
+                    command_line = f.read()
+            except OSError:
+                continue
+
+            name = _executable_name(command_line)
+            if name in results:
+                results[name].append(int(entry))
+
+        return results
+
+    def is_process_running(self, handle: ProcfsHandle) -> bool:
+        try:
+            with open(f"/proc/{handle.process_id}/stat") as f:
+                stat = f.read()
+        except FileNotFoundError:
+            return False
+
+        # Exited processes linger as zombies until reaped by their parent.
+        state = stat.rsplit(")", 1)[1].split()[0]
+        return state not in ("Z", "X")
+
+    def open_process(
+        self,
+        process_id: int,
+        memory_access: bool = False,
+    ) -> ProcfsHandle:
+        return ProcfsHandle(process_id)
+
+    def create_process(self, path: str) -> ProcessCreationResult:
+        process = subprocess.Popen([path])
+        return ProcessCreationResult(process.pid, ProcfsHandle(process.pid))
+
+    def get_process_path(self, handle: ProcfsHandle) -> str:
+        return os.readlink(f"/proc/{handle.process_id}/exe")
+
+    def get_modules(
+        self,
+        handle: ProcfsHandle,
+        filter: FilterLike = lambda x: True,
+    ) -> Iterable[ModuleInfo]:
+        # A module is mapped as several regions (one per section), so they are
+        # merged into a single range per file.
+        ranges: dict[str, list[int]] = {}
+
+        with open(f"/proc/{handle.process_id}/maps") as f:
+            for line in f:
+                fields = line.split(maxsplit=5)
+                if len(fields) < 6:
+                    continue
+
+                path = fields[5].strip()
+                start, end = (int(address, 16) for address in fields[0].split("-"))
+
+                if path not in ranges:
+                    ranges[path] = [start, end]
+                else:
+                    ranges[path][1] = max(ranges[path][1], end)
+
+        for path, (start, end) in ranges.items():
+            name = path.rsplit("/", 1)[-1]
+            if not filter(name):
+                continue
+
+            yield ModuleInfo(name, start, end - start)
+
+    def read_memory(self, handle: ProcfsHandle, address: int, size: int) -> bytes:
+        return os.pread(handle._fd, size, address)
+
+    def read_memory_into(
+        self,
+        handle: ProcfsHandle,
+        address: int,
+        buffer: memoryview,
+    ) -> int:
+        return os.preadv(handle._fd, (buffer,), address)
+
+    def write_memory(self, handle: ProcfsHandle, address: int, data: bytes) -> None:
+        if os.pwrite(handle._fd, data, address) != len(data):
+            raise OSError(f"Failed to write memory at {address:#x}.")
+
+
+class FakeProcess:
+    """An in-memory stand-in for a process, made up of mapped modules."""
+
+    __slots__ = (
+        "id",
+        "name",
+        "path",
+        "modules",
+        "_regions",
+    )
+
+    def __init__(self, id: int, name: str, path: str) -> None:
+        self.id = id
+        self.name = name
+        self.path = path
+        self.modules: list[ModuleInfo] = []
+        self._regions: list[tuple[int, bytearray]] = []
+
+    def __repr__(self) -> str:
+        return f"FakeProcess({self.id}, {self.name!r})"
+
+    def close(self) -> None:
+        pass
+
+    def map_module(self, name: str, base: int, data: bytes) -> ModuleInfo:
+        """Maps a copy of `data` at `base`, listing it as a loaded module."""
+
+        module = ModuleInfo(name, base, len(data))
+        self.modules.append(module)
+        self._regions.append((base, bytearray(data)))
+
+        return module
+
+    def _region(self, address: int, size: int) -> tuple[int, bytearray]:
+        for base, region in self._regions:
+            if base <= address and address + size <= base + len(region):
+                return address - base, region
+
+        raise OSError(f"Address range {address:#x}+{size:#x} is not mapped.")
+
+    def read(self, address: int, size: int) -> bytes:
+        offset, region = self._region(address, size)
+        return bytes(region[offset : offset + size])
+
+    def read_into(self, address: int, buffer: memoryview) -> int:
+        offset, region = self._region(address, len(buffer))
+        buffer[:] = memoryview(region)[offset : offset + len(buffer)]
+        return len(buffer)
+
+    def write(self, address: int, data: bytes) -> None:
+        offset, region = self._region(address, len(data))
+        region[offset : offset + len(data)] = data
+
+
+class FakeBackend:
+    """An in-memory backend, where handles are the `FakeProcess` objects
+    themselves. Executables may be installed to be started by
+    `create_process`."""
+
+    def __init__(self) -> None:
+        self.processes: dict[int, FakeProcess] = {}
+        self.executables: dict[str, Callable[[FakeProcess], None]] = {}
+        self._next_id = 1000
+
+    def add_process(self, name: str, path: str = "") -> FakeProcess:
+        process = FakeProcess(self._next_id, name, path or name)
+        self.processes[process.id] = process
+        self._next_id += 4
+
+        return process
+
+    def kill_process(self, process_id: int) -> None:
+        del self.processes[process_id]
+
+    def install(self, path: str, setup: Callable[[FakeProcess], None]) -> None:
+        """Registers an executable, where `setup` is called with each new
+        `FakeProcess` to map its modules."""
+
+        self.executables[path] = setup
+
+    def process_id_by_name(self, name: str) -> int | None:
+        process_ids = self.process_ids_by_names((name,))[name]
+        return process_ids[0] if process_ids else None
+
+    def process_ids_by_names(self, names: Iterable[str]) -> dict[str, list[int]]:
+        results: dict[str, list[int]] = {name: [] for name in names}
+
+        for process in self.processes.values():
+            if process.name in results:
+                results[process.name].append(process.id)
+
+        return results
+
+    def is_process_running(self, handle: FakeProcess) -> bool:
+        return handle.id in self.processes
+
+    def open_process(
+        self,
+        process_id: int,
+        memory_access: bool = False,
+    ) -> FakeProcess:
+        if process_id not in self.processes:
+            raise OSError(f"Failed to open process: no process {process_id}.")
+
+        return self.processes[process_id]
+
+    def create_process(self, path: str) -> ProcessCreationResult:
+        if path not in self.executables:
+            raise OSError(f"Failed to create process: {path!r} is not installed.")
+
+        process = self.add_process(os.path.basename(path.replace("\\", "/")), path)
+        self.executables[path](process)
+
+        return ProcessCreationResult(process.id, process)
+
+    def get_process_path(self, handle: FakeProcess) -> str:
+        return handle.path
+
+    def get_modules(
+        self,
+        handle: FakeProcess,
+        filter: FilterLike = lambda x: True,
+    ) -> Iterable[ModuleInfo]:
+        self._check_running(handle)
+        return [module for module in handle.modules if filter(module.name)]
+
+    def read_memory(self, handle: FakeProcess, address: int, size: int) -> bytes:
+        self._check_running(handle)
+        return handle.read(address, size)
+
+    def read_memory_into(
+        self,
+        handle: FakeProcess,
+        address: int,
+        buffer: memoryview,
+    ) -> int:
+        self._check_running(handle)
+        return handle.read_into(address, buffer)
+
+    def write_memory(self, handle: FakeProcess, address: int, data: bytes) -> None:
+        self._check_running(handle)
+        handle.write(address, data)
+
+    def _check_running(self, handle: FakeProcess) -> None:
+        # Mirrors the Windows API failing once the process has exited.
+        if handle.id not in self.processes:
+            raise OSError(f"Process {handle.id} is not running.")
+
+
+class ProcessTable:
+    """Looks up processes by executable name, reusing the results of a single
+    snapshot for `ttl` seconds so that frequent checks stay cheap."""
+
+    __slots__ = (
+        "backend",
+        "names",
+        "ttl",
+        "_process_ids",
+        "_expires_at",
+    )
+
+    def __init__(
+        self,
+        backend: ProcessBackend,
+        names: Iterable[str],
+        ttl: float = 0.5,
+    ) -> None:
+        self.backend = backend
+        self.names = tuple(names)
+        self.ttl = ttl
+        self._process_ids: dict[str, list[int]] = {}
+        self._expires_at = 0.0
+
+    def __repr__(self) -> str:
+        return f"ProcessTable({', '.join(self.names)})"
+
+    def get(self) -> dict[str, list[int]]:
+        """Returns the IDs of the running processes for each name."""
+
+        now = time.monotonic()
+        if now >= self._expires_at:
+            self._process_ids = self.backend.process_ids_by_names(self.names)
+            self._expires_at = now + self.ttl
+
+        return self._process_ids
+
+    def invalidate(self) -> None:
+        """Forces the next lookup to take a new snapshot."""
+
+        self._expires_at = 0.0
+
+    def first(self) -> int | None:
+        """Returns the ID of a running process, preferring earlier names."""
+
+        process_ids = self.get()
+        for name in self.names:
+            if process_ids.get(name):
+                return process_ids[name][0]
+
+        return None
+
+
+def default_backend() -> ProcessBackend:
+    """Returns the backend for the platform being run on."""
+
+    if os.name == "nt":
+        return WinAPIBackend()
+
+    return ProcfsBackend()
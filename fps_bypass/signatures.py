@@ -0,0 +1,184 @@
+# The signatures used to find things in the game's memory, loaded from a data
+# file so that a game update only needs new data rather than a new release.
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass
+
+import config
+import memory
+import pointers
+
+logger = logging.getLogger("rich")
+
+SIGNATURE_DB_VERSION = 2
+
+# Bundled next to the modules (and added to the executable, see the Makefile).
+# Signatures taken from https://github.com/34736384/genshin-fps-unlock
+BUNDLED_DATABASE_PATH = os.path.join(os.path.dirname(__file__), "signatures.json")
+
+# Targets, each with signatures to try in turn.
+TARGET_FPS = "fps"
+
+
+@dataclass(frozen=True)
+class SignatureEntry:
+    name: str
+    signature: memory.Signature
+    # How to get from the match to the target.
+    path: pointers.PointerPath
+    # Fingerprints of the UserAssembly.dll builds the signature is known to
+    # work for. Empty if it is not specific to any build.
+    builds: tuple[str, ...] = ()
+
+    @property
+    def key(self) -> str:
+        """Identifies the signature and path across database revisions."""
+
+        data = f"{self.signature!r}:{self.path}".encode()
+        return hashlib.sha256(data).hexdigest()[:16]
+
+
+def _entry_from_dict(data: dict) -> SignatureEntry:
+    sections = data.get("sections")
+
+    return SignatureEntry(
+        name=data["name"],
+        signature=memory.Signature.from_string(
+            data["signature"],
+            engine=data.get("engine"),
+            sections=tuple(sections) if sections is not None else None,
+        ),
+        path=pointers.PointerPath(data["path"]),
+        builds=tuple(data.get("builds", ())),
+    )
+
+
+@dataclass
+class SignatureDatabase:
+    # Higher revisions take priority, letting newer data replace the bundled one.
+    revision: int
+    targets: dict[str, tuple[SignatureEntry, ...]]
+
+    def get_entry(self, target: str, key: str) -> SignatureEntry | None:
+        for entry in self.targets.get(target, ()):
+            if entry.key == key:
+                return entry
+
+        return None
+
+    def candidates(
+        self,
+        target: str,
+        build: str | None = None,
+        successes: config.SignatureStats | None = None,
+    ) -> list[SignatureEntry]:
+        """Orders the target's entries by how likely they are to match: those
+        for this build first, then those for any build, then those for other
+        builds, each by past successes and otherwise in database order."""
+
+        successes = successes or {}
+
+        def rank(entry: SignatureEntry) -> tuple[int, int]:
+            if not entry.builds:
+                group = 1
+            elif build in entry.builds:
+                group = 0
+            else:
+                group = 2
+
+            return group, -successes.get(entry.key, 0)
+
+        return sorted(self.targets.get(target, ()), key=rank)
+
+
+def database_from_json(json_str: str) -> SignatureDatabase:
+    data = json.loads(json_str)
+
+    if data["version"] != SIGNATURE_DB_VERSION:
+        raise ValueError(f"Unsupported signature database version {data['version']}.")
+
+    return SignatureDatabase(
+        revision=data["revision"],
+        targets={
+            target: tuple(_entry_from_dict(entry) for entry in entries)
+            for target, entries in data["targets"].items()
+        },
+    )
+
+
+def _read_database(path: str) -> SignatureDatabase:
+    with open(path) as f:
+        return database_from_json(f.read())
+
+
+def load_database() -> SignatureDatabase:
+    """Loads the bundled signature database, or the user's if it is newer."""
+
+    database = _read_database(BUNDLED_DATABASE_PATH)
+
+    user_path = config.get_user_signatures_path()
+    if not os.path.exists(user_path):
+        return database
+
+    try:
+        user_database = _read_database(user_path)
+    except Exception:
+        logger.warning("Failed to read the user signatures. Ignoring them.")
+        logger.debug("Failed to read the user signatures.", exc_info=True)
+        return database
+
+    if user_database.revision > database.revision:
+        logger.debug(f"Using user signatures (revision {user_database.revision}).")
+        return user_database
+
+    return database
+
+
+_database: SignatureDatabase | None = None
+_database_lock = threading.Lock()
+
+
+def get_database() -> SignatureDatabase:
+    """Returns the signature database, loading it on first use."""
+
+    global _database
+
+    with _database_lock:
+        if _database is None:
+            _database = load_database()
+
+        return _database
+
+
+def compile_scanners(entries: list[SignatureEntry]) -> None:
+    """Compiles the scanners of the entries ahead of scanning."""
+
+    for entry in entries:
+        entry.signature.compile()
+
+
+def get_candidates(target: str, build: str | None = None) -> list[SignatureEntry]:
+    """Returns the signatures for the target in the order they should be
+    tried, with their scanners ready."""
+
+    candidates = get_database().candidates(
+        target,
+        build,
+        config.read_signature_stats(),
+    )
+    compile_scanners(candidates)
+
+    return candidates
+
+
+def record_success(entry: SignatureEntry) -> None:
+    """Notes that the entry led to its target, so it is tried earlier."""
+
+    stats = config.read_signature_stats()
+    stats[entry.key] = stats.get(entry.key, 0) + 1
+    config.write_signature_stats(stats)
@@ -0,0 +1,265 @@
+# Enforcing the FPS of every running game instance at once.
+from __future__ import annotations
+
+import asyncio
+import logging
+
+import enforcement
+import genshin
+import process
+import utils
+
+logger = logging.getLogger("rich")
+
+# How often to look for newly started instances, in seconds.
+DEFAULT_DISCOVERY_INTERVAL = 2.0
+
+# How long attaching to a single instance may take, in seconds.
+ATTACH_TIMEOUT = 600
+
+
+class Supervisor:
+    """Discovers running instances of the game and enforces the FPS of all of
+    them. Instances of the same game version share a single signature scan."""
+
+    __slots__ = (
+        "backend",
+        "group",
+        "workers",
+        "discovery_interval",
+        "instances",
+        "_attaching",
+        "_failed",
+        "_scans",
+        "_discovered",
+        "_stopped",
+    )
+
+    def __init__(
+        self,
+        target_fps: int,
+        backend: process.ProcessBackend = genshin.DEFAULT_BACKEND,
+        workers: int = 1,
+        min_interval: float = enforcement.DEFAULT_MIN_INTERVAL,
+        max_interval: float = enforcement.DEFAULT_MAX_INTERVAL,
+        discovery_interval: float = DEFAULT_DISCOVERY_INTERVAL,
+    ) -> None:
+        self.backend = backend
+        self.group = enforcement.EnforcementGroup(
+            target_fps,
+            min_interval=min_interval,
+            max_interval=max_interval,
+        )
+        self.workers = workers
+        self.discovery_interval = discovery_interval
+        # Every instance opened, by process ID.
+        self.instances: dict[int, genshin.GenshinInfo] = {}
+
+        self._attaching: dict[int, asyncio.Task[None]] = {}
+        # Process IDs of instances which could not be attached to. They are not
+        # retried, as neither their build nor their memory will change.
+        self._failed: set[int] = set()
+        # Signature scans by module fingerprint.
+        self._scans: dict[str, asyncio.Future[genshin.SignatureMatch | None]] = {}
+        self._discovered = asyncio.Event()
+        self._stopped = asyncio.Event()
+
+    @property
+    def target_fps(self) -> int:
+        return self.group.target_fps
+
+    @target_fps.setter
+    def target_fps(self, fps: int) -> None:
+        self.group.target_fps = fps
+
+    async def _find_fps_signature(
+        self,
+        genshin_info: genshin.GenshinInfo,
+        modules: genshin.GenshinModules,
+    ) -> genshin.SignatureMatch | None:
+        fingerprint = await asyncio.to_thread(
+            genshin.get_modules_fingerprint,
+            genshin_info,
+            modules,
+        )
+
+        scan = self._scans.get(fingerprint)
+        if scan is None:
+            logger.debug(f"Scanning {genshin_info.id} for {fingerprint}.")
+            scan = asyncio.ensure_future(
+                asyncio.to_thread(
+                    genshin.find_fps_signature,
+                    genshin_info,
+                    modules,
+                    self.workers,
+                ),
+            )
+            self._scans[fingerprint] = scan
+
+        try:
+            # Shielded so one instance closing does not cancel the scan for the
+            # others waiting on it.
+            return await asyncio.shield(scan)
+        except OSError:
+            # Let the next instance of this version retry.
+            if self._scans.get(fingerprint) is scan:
+                del self._scans[fingerprint]
+
+            raise
+
+    async def _get_memory_pointers(
+        self,
+        genshin_info: genshin.GenshinInfo,
+        modules: genshin.GenshinModules,
+    ) -> genshin.MemoryPointers | None:
+        pointers = await asyncio.to_thread(
+            genshin.get_cached_pointers,
+            genshin_info,
+            modules,
+        )
+        if pointers:
+            return pointers
+
+        match = await self._find_fps_signature(genshin_info, modules)
+        if match is None:
+            return None
+
+        return await utils.wait_for_async(
+            lambda: genshin.resolve_memory_pointers(
+                genshin_info,
+                modules,
+                match,
+            ),
+            0.2,
+        )
+
+    async def attach(self, genshin_info: genshin.GenshinInfo) -> None:
+        """Resolves the pointers of an instance and starts enforcing its FPS
+        once it has loaded."""
+
+        modules = await genshin.wait_for_modules_async(genshin_info)
+        pointers = await self._get_memory_pointers(genshin_info, modules)
+
+        if not pointers:
+            logger.warning(f"Failed to find the offsets of {genshin_info.id}.")
+            return
+
+        state = genshin.FPSState(
+            genshin=genshin_info,
+            modules=modules,
+            pointers=pointers,
+        )
+        await state.wait_for_fps_async()
+
+        self.group.add(state)
+        logger.info(f"Enforcing the FPS of {genshin_info.id}.")
+
+    async def _attach(self, genshin_info: genshin.GenshinInfo) -> None:
+        try:
+            await asyncio.wait_for(self.attach(genshin_info), ATTACH_TIMEOUT)
+        except (OSError, asyncio.TimeoutError):
+            logger.debug(f"Failed to attach to {genshin_info.id}.", exc_info=True)
+        except Exception:
+            logger.warning(f"Failed to attach to {genshin_info.id}.", exc_info=True)
+        finally:
+            del self._attaching[genshin_info.id]
+
+        if genshin_info.id not in self.group.schedulers:
+            self._failed.add(genshin_info.id)
+
+    def _close_instance(self, process_id: int) -> None:
+        self.group.remove(process_id)
+
+        genshin_info = self.instances.pop(process_id)
+        genshin_info.handle.close()
+
+    async def discover(self) -> None:
+        """Starts attaching to instances which have started since the last call,
+        and releases those which have closed."""
+
+        for process_id in list(self.instances):
+            if (
+                process_id not in self.group.schedulers
+                and process_id not in self._attaching
+            ):
+                self._close_instance(process_id)
+
+        table = genshin.get_process_table(self.backend)
+        table.invalidate()
+        process_ids = await asyncio.to_thread(table.get)
+        running = {pid for pids in process_ids.values() for pid in pids}
+
+        # Forgotten once closed, in case the ID is reused by a new instance.
+        self._failed &= running
+
+        for process_id in running:
+            if process_id in self.instances or process_id in self._failed:
+                continue
+
+            try:
+                handle = await asyncio.to_thread(
+                    self.backend.open_process,
+                    process_id,
+                    True,
+                )
+                path = await asyncio.to_thread(self.backend.get_process_path, handle)
+            except OSError:
+                logger.debug(f"Failed to open process {process_id}.", exc_info=True)
+                continue
+
+            genshin_info = genshin.GenshinInfo(
+                id=process_id,
+                path=path,
+                handle=handle,
+                backend=self.backend,
+            )
+            self.instances[process_id] = genshin_info
+            self._attaching[process_id] = asyncio.create_task(
+                self._attach(genshin_info),
+            )
+
+        self._discovered.set()
+
+    async def wait_for_first_discovery(self) -> None:
+        """Waits for the first discovery, and attaching to the instances it
+        found, to finish."""
+
+        await self._discovered.wait()
+
+        # Not gathered, as cancelling the wait must not cancel the attaching.
+        if attaching := list(self._attaching.values()):
+            await asyncio.wait(attaching)
+
+    async def run(self) -> None:
+        """Supervises the game instances until stopped."""
+
+        enforcement_task = asyncio.create_task(self.group.run_async())
+
+        try:
+            while not self._stopped.is_set():
+                await self.discover()
+
+                try:
+                    await asyncio.wait_for(
+                        self._stopped.wait(),
+                        self.discovery_interval,
+                    )
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self.group.stop()
+
+            for task in list(self._attaching.values()):
+                task.cancel()
+
+            await asyncio.gather(
+                enforcement_task,
+                *self._attaching.values(),
+                return_exceptions=True,
+            )
+
+            for process_id in list(self.instances):
+                self._close_instance(process_id)
+
+    def stop(self) -> None:
+        self._stopped.set()
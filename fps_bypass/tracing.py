@@ -0,0 +1,203 @@
+# Timing of the bypass' phases, exported in the Chrome trace event format
+# (viewable in chrome://tracing or https://ui.perfetto.dev).
+from __future__ import annotations
+
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextlib import nullcontext
+from typing import Any
+from typing import Callable
+from typing import ContextManager
+from typing import Iterator
+from typing import TypeVar
+
+T = TypeVar("T", bound=Callable[..., Any])
+
+
+class Tracer:
+    """Records spans as Chrome trace events."""
+
+    __slots__ = (
+        "events",
+        "_start",
+        "_process_id",
+        "_thread_names",
+    )
+
+    def __init__(self) -> None:
+        self.events: list[dict[str, Any]] = []
+        self._start = time.perf_counter_ns()
+        self._process_id = os.getpid()
+        self._thread_names: dict[int, str] = {}
+
+    def _timestamp(self) -> float:
+        # Chrome traces are in microseconds.
+        return (time.perf_counter_ns() - self._start) / 1000
+
+    def _thread_id(self) -> int:
+        thread_id = threading.get_ident()
+
+        if thread_id not in self._thread_names:
+            self._thread_names[thread_id] = threading.current_thread().name
+
+        return thread_id
+
+    @contextmanager
+    def span(
+        self,
+        name: str,
+        category: str,
+        args: dict[str, Any] | None = None,
+    ) -> Iterator[None]:
+        start = self._timestamp()
+
+        try:
+            yield
+        finally:
+            # Appending to a list is atomic, so spans may end on any thread.
+            self.events.append(
+                {
+                    "name": name,
+                    "cat": category,
+                    "ph": "X",
+                    "ts": start,
+                    "dur": self._timestamp() - start,
+                    "pid": self._process_id,
+                    "tid": self._thread_id(),
+                    "args": args or {},
+                },
+            )
+
+    def instant(
+        self,
+        name: str,
+        category: str,
+        args: dict[str, Any] | None = None,
+    ) -> None:
+        self.events.append(
+            {
+                "name": name,
+                "cat": category,
+                "ph": "i",
+                "s": "t",
+                "ts": self._timestamp(),
+                "pid": self._process_id,
+                "tid": self._thread_id(),
+                "args": args or {},
+            },
+        )
+
+    def as_chrome_trace(self) -> dict[str, Any]:
+        thread_names = [
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": self._process_id,
+                "tid": thread_id,
+                "args": {"name": name},
+            }
+            for thread_id, name in list(self._thread_names.items())
+        ]
+
+        return {
+            "traceEvents": thread_names + self.events,
+            "displayTimeUnit": "ms",
+        }
+
+
+# `None` while tracing is disabled, so that the check is all it costs.
+_tracer: Tracer | None = None
+_NULL_SPAN = nullcontext()
+
+
+def enable() -> Tracer:
+    global _tracer
+
+    if _tracer is None:
+        _tracer = Tracer()
+
+    return _tracer
+
+
+def disable() -> None:
+    global _tracer
+    _tracer = None
+
+
+def is_enabled() -> bool:
+    return _tracer is not None
+
+
+def span(name: str, category: str = "startup", **args: Any) -> ContextManager[None]:
+    """Times the body of a `with` block while tracing is enabled."""
+
+    if _tracer is None:
+        return _NULL_SPAN
+
+    return _tracer.span(name, category, args)
+
+
+def instant(name: str, category: str = "startup", **args: Any) -> None:
+    """Marks a point in time while tracing is enabled."""
+
+    if _tracer is not None:
+        _tracer.instant(name, category, args)
+
+
+def traced(category: str, name: str | None = None) -> Callable[[T], T]:
+    """Times every call of the decorated function while tracing is enabled.
+    Generators are timed until exhausted and coroutines until they return."""
+
+    def decorator(func: T) -> T:
+        span_name = name or func.__name__
+
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                if _tracer is None:
+                    return await func(*args, **kwargs)
+
+                with _tracer.span(span_name, category):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper  # type: ignore
+
+        if inspect.isgeneratorfunction(func):
+
+            @functools.wraps(func)
+            def generator_wrapper(*args: Any, **kwargs: Any) -> Any:
+                if _tracer is None:
+                    return (yield from func(*args, **kwargs))
+
+                with _tracer.span(span_name, category):
+                    return (yield from func(*args, **kwargs))
+
+            return generator_wrapper  # type: ignore
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if _tracer is None:
+                return func(*args, **kwargs)
+
+            with _tracer.span(span_name, category):
+                return func(*args, **kwargs)
+
+        return wrapper  # type: ignore
+
+    return decorator
+
+
+def write_chrome_trace(path: str) -> None:
+    """Writes the events traced so far to a Chrome trace JSON file."""
+
+    if _tracer is None:
+        return
+
+    with open(path, "w") as f:
+        json.dump(_tracer.as_chrome_trace(), f)
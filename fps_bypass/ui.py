@@ -0,0 +1,164 @@
+# Console output, either through rich or as plain text.
+from __future__ import annotations
+
+import logging
+import re
+import threading
+from contextlib import contextmanager
+from typing import ContextManager
+from typing import Iterator
+from typing import Protocol
+from typing import TYPE_CHECKING
+
+import utils
+
+if TYPE_CHECKING:
+    from rich.progress import Progress
+    from rich.progress import TaskID
+
+# Rich emoji codes (":white_check_mark:") and markup tags ("[blue]").
+_MARKUP_PATTERN = re.compile(r":[a-z_]+: ?|\[/?[a-z ]+\]")
+
+
+def strip_markup(text: str) -> str:
+    return _MARKUP_PATTERN.sub("", text)
+
+
+class ProgressTask(Protocol):
+    def advance(self) -> None:
+        ...
+
+
+class UI(Protocol):
+    """What the bypass needs from the console. Messages may use rich markup,
+    which plain text output strips."""
+
+    def title(self, text: str) -> None:
+        ...
+
+    def log(self, message: str) -> None:
+        ...
+
+    def progress(
+        self,
+        description: str,
+        total: int | None,
+    ) -> ContextManager[ProgressTask]:
+        ...
+
+    def ask_int(self, prompt: str, default: int, cancelled: threading.Event) -> int:
+        """Asks for a number until a valid one is entered, raising
+        `utils.InputCancelled` once `cancelled` is set."""
+        ...
+
+    def logging_handler(self) -> logging.Handler:
+        ...
+
+
+class _PlainProgressTask:
+    __slots__ = ()
+
+    def advance(self) -> None:
+        pass
+
+
+class PlainUI:
+    """Plain text output, without the cost of importing rich."""
+
+    def title(self, text: str) -> None:
+        print(text)
+
+    def log(self, message: str) -> None:
+        print(strip_markup(message))
+
+    @contextmanager
+    def progress(self, description: str, total: int | None) -> Iterator[ProgressTask]:
+        print(f"{strip_markup(description)}...")
+        yield _PlainProgressTask()
+
+    def ask_int(self, prompt: str, default: int, cancelled: threading.Event) -> int:
+        while True:
+            print(f"{strip_markup(prompt)} ", end="", flush=True)
+            value = utils.read_line(cancelled).strip()
+
+            if not value:
+                return default
+
+            try:
+                return int(value)
+            except ValueError:
+                print("Please enter a valid integer number.")
+
+    def logging_handler(self) -> logging.Handler:
+        handler = logging.StreamHandler()
+        handler.setFormatter(
+            logging.Formatter("[%(asctime)s] %(levelname)s %(message)s", "%X"),
+        )
+        return handler
+
+
+class _RichProgressTask:
+    __slots__ = (
+        "progress",
+        "task_id",
+    )
+
+    def __init__(self, progress: Progress, task_id: TaskID) -> None:
+        self.progress = progress
+        self.task_id = task_id
+
+    def advance(self) -> None:
+        self.progress.update(self.task_id, advance=1)
+
+
+class RichUI:
+    """Fancy output through rich, which is only imported when used."""
+
+    def __init__(self) -> None:
+        from rich.console import Console
+        from rich.traceback import install
+
+        self.console = Console()
+        install(console=self.console)
+
+    def title(self, text: str) -> None:
+        self.console.print(text, style="bold underline blue", highlight=False)
+
+    def log(self, message: str) -> None:
+        self.console.log(message)
+
+    @contextmanager
+    def progress(self, description: str, total: int | None) -> Iterator[ProgressTask]:
+        from rich.progress import BarColumn
+        from rich.progress import Progress
+        from rich.progress import TaskProgressColumn
+        from rich.progress import TextColumn
+
+        with Progress(
+            TextColumn("[progress.description]{task.description}"),
+            BarColumn(),
+            TaskProgressColumn(),
+            transient=True,
+            console=self.console,
+        ) as progress:
+            task_id = progress.add_task(description, start=False, total=total)
+            yield _RichProgressTask(progress, task_id)
+
+    def ask_int(self, prompt: str, default: int, cancelled: threading.Event) -> int:
+        from rich.prompt import IntPrompt
+
+        return IntPrompt.ask(
+            prompt=prompt,
+            console=self.console,
+            default=default,
+            show_default=False,
+            stream=utils.CancellableStdin(cancelled),
+        )
+
+    def logging_handler(self) -> logging.Handler:
+        from rich.logging import RichHandler
+
+        return RichHandler(
+            rich_tracebacks=True,
+            console=self.console,
+        )
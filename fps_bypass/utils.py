@@ -1,13 +1,15 @@
 # General usage utility functions.
 from __future__ import annotations
 
+import asyncio
+import os
+import select
 import sys
+import threading
 import time
 from typing import Callable
 from typing import TypeVar
 
-import winapi
-
 
 NO_PAUSE = "no-pause" in sys.argv
 
@@ -30,6 +32,127 @@ def wait_for(func: Callable[[], T | None], timeout: float = 0.1) -> T:
     return res
 
 
+async def wait_for_async(
+    func: Callable[[], T | None],
+    interval: float = 0.1,
+    timeout: float | None = None,
+) -> T:
+    """Waits for a function to return a value, running it in an executor.
+    Raises `asyncio.TimeoutError` if it does not within `timeout` seconds."""
+
+    async def poll() -> T:
+        while not (res := await asyncio.to_thread(func)):
+            await asyncio.sleep(interval)
+
+        return res
+
+    return await asyncio.wait_for(poll(), timeout)
+
+
+class InputCancelled(Exception):
+    """Raised when waiting for input is cancelled."""
+
+
+# Input read past the end of the line returned, kept for the next one.
+_pending_input = bytearray()
+
+
+def _stdin_ready(timeout: float) -> bool:
+    """Waits up to `timeout` seconds for the standard input to be readable."""
+
+    if os.name != "nt":
+        ready, _, _ = select.select([sys.stdin], [], [], timeout)
+        return bool(ready)
+
+    # Imported here so the rest of the utilities remain usable off Windows.
+    import winapi
+
+    # Files and closed pipes never block.
+    if winapi.get_pipe_bytes_available(sys.stdin.fileno()) != 0:
+        return True
+
+    time.sleep(timeout)
+    return False
+
+
+def _read_console_line(cancelled: threading.Event, interval: float) -> str:
+    import msvcrt
+
+    chars: list[str] = []
+
+    while True:
+        while not msvcrt.kbhit():
+            if cancelled.wait(interval):
+                raise InputCancelled
+
+        char = msvcrt.getwch()
+
+        # Function and arrow keys are followed by their scan code.
+        if char in ("\x00", "\xe0"):
+            msvcrt.getwch()
+        elif char == "\r":
+            msvcrt.putwch("\r")
+            msvcrt.putwch("\n")
+            return "".join(chars)
+        elif char == "\x03":
+            raise KeyboardInterrupt
+        elif char == "\b":
+            if chars:
+                chars.pop()
+                for echo in "\b \b":
+                    msvcrt.putwch(echo)
+        else:
+            chars.append(char)
+            msvcrt.putwch(char)
+
+
+def read_line(cancelled: threading.Event, interval: float = 0.1) -> str:
+    """Reads a line from the standard input like `input`, but checks every
+    `interval` seconds whether `cancelled` is set, raising `InputCancelled` if
+    so. This lets a thread waiting for input be stopped, rather than holding up
+    (or crashing) the interpreter's shutdown."""
+
+    if os.name == "nt" and sys.stdin.isatty():
+        return _read_console_line(cancelled, interval)
+
+    fd = sys.stdin.fileno()
+
+    while (end := _pending_input.find(b"\n")) == -1:
+        if cancelled.is_set():
+            raise InputCancelled
+
+        if not _stdin_ready(interval):
+            continue
+
+        data = os.read(fd, 4096)
+        if not data:
+            if not _pending_input:
+                raise EOFError
+
+            end = len(_pending_input)
+            break
+
+        _pending_input.extend(data)
+
+    line = bytes(_pending_input[:end])
+    del _pending_input[: end + 1]
+
+    return line.decode(sys.stdin.encoding or "utf-8", errors="replace").rstrip("\r")
+
+
+class CancellableStdin:
+    """Just enough of a file over `read_line` for prompts taking an input
+    stream."""
+
+    __slots__ = ("cancelled",)
+
+    def __init__(self, cancelled: threading.Event) -> None:
+        self.cancelled = cancelled
+
+    def readline(self) -> str:
+        return read_line(self.cancelled) + "\n"
+
+
 # Why is this not in the standard library?
 def clamp(value: int, minimum: int, maximum: int) -> int:
     """Clamps a value between a minimum and maximum."""
@@ -41,6 +164,9 @@ def get_default_fps() -> int:
     """Returns the FPS value that the bypass will default to based on
     the user's setup."""
 
+    # Imported here so the rest of the utilities remain usable off Windows.
+    import winapi
+
     refresh_rate = winapi.get_main_refresh_rate()
 
     # On some configs, this is weird. Clamp it to a reasonable range.
@@ -3,18 +3,26 @@
 from __future__ import annotations
 
 import ctypes
+import os
 from ctypes.wintypes import DWORD
 from ctypes.wintypes import HMODULE
 from typing import Callable
 from typing import Generator
+from typing import Iterable
 from typing import NamedTuple
 
+import metrics
+import tracing
+
 from .constants import *
 from .structures import *
 
-win32 = ctypes.windll.kernel32
-psapi = ctypes.windll.psapi
-winuser = ctypes.windll.user32
+# The module remains importable elsewhere so the types can be shared with the
+# other process backends, but none of the functions will work.
+if os.name == "nt":
+    win32 = ctypes.windll.kernel32
+    psapi = ctypes.windll.psapi
+    winuser = ctypes.windll.user32
 
 
 class Handle:
@@ -56,6 +64,20 @@ class Handle:
         return self._handle != 0
 
 
+_SNAPSHOTS = metrics.counter(
+    "fps_bypass_process_snapshots_total",
+    "Process list snapshots taken.",
+)
+_MEMORY_READS = metrics.counter(
+    "fps_bypass_read_process_memory_total",
+    "Calls to ReadProcessMemory.",
+)
+_MEMORY_WRITES = metrics.counter(
+    "fps_bypass_write_process_memory_total",
+    "Calls to WriteProcessMemory.",
+)
+
+
 def _make_raw_handle(handle: Handle) -> int:
     """Returns the raw handle value. Used to pass handles to the Windows API."""
 
@@ -78,9 +100,11 @@ def get_os_error_fmt() -> str | None:
     return f"{ctypes.FormatError(code)} ({code})"
 
 
+@tracing.traced("winapi.snapshot")
 def process_id_by_name(name: str) -> int | None:
     """Returns the process ID of a process by the executable name."""
 
+    _SNAPSHOTS.inc()
     snapshot = Handle(
         win32.CreateToolhelp32Snapshot(
             TH32CS_SNAPPROCESS,
@@ -114,6 +138,64 @@ def process_id_by_name(name: str) -> int | None:
     return None
 
 
+@tracing.traced("winapi.snapshot")
+def process_ids_by_names(names: Iterable[str]) -> dict[str, list[int]]:
+    """Returns the process IDs of every process matching any of the given
+    executable names, using a single snapshot."""
+
+    names = set(names)
+    results: dict[str, list[int]] = {name: [] for name in names}
+
+    _SNAPSHOTS.inc()
+    snapshot = Handle(
+        win32.CreateToolhelp32Snapshot(
+            TH32CS_SNAPPROCESS,
+            0,
+        ),
+    )
+
+    with snapshot:
+        process_entry = PROCESSENTRY32()
+        process_entry.dwSize = ctypes.sizeof(PROCESSENTRY32)
+
+        process = win32.Process32First(
+            _make_raw_handle(snapshot),
+            ctypes.byref(process_entry),
+        )
+
+        if not process:
+            raise OSError(
+                f"Failed to get process entry. Error code: {get_os_error_fmt()}",
+            )
+
+        while process:
+            name = process_entry.szExeFile.decode()
+            if name in names:
+                results[name].append(process_entry.th32ProcessID)
+
+            process = win32.Process32Next(
+                _make_raw_handle(snapshot),
+                ctypes.byref(process_entry),
+            )
+
+    return results
+
+
+@tracing.traced("winapi.process")
+def is_process_running(handle: Handle) -> bool:
+    """Returns whether the process behind a handle is still running. Requires
+    the handle to have been opened with `SYNCHRONISE` access."""
+
+    # The DWORD result comes back as a signed int by default.
+    result = win32.WaitForSingleObject(_make_raw_handle(handle), 0) & 0xFFFFFFFF
+
+    if result == WAIT_FAILED:
+        raise OSError(f"Failed to wait for process: {get_os_error_fmt()}")
+
+    return result == WAIT_TIMEOUT
+
+
+@tracing.traced("winapi.process")
 def terminate_process(handle: Handle) -> None:
     """Terminates a process by handle and closes it."""
 
@@ -124,8 +206,12 @@ def terminate_process(handle: Handle) -> None:
 
 
 DEFAULT_ACCESS = PROCESS_QUERY_INFORMATION | SYNCHRONISE
+MEMORY_ACCESS = (
+    DEFAULT_ACCESS | PROCESS_VM_READ | PROCESS_VM_WRITE | PROCESS_VM_OPERATION
+)
 
 
+@tracing.traced("winapi.process")
 def open_process(process_id: int, access: int = DEFAULT_ACCESS) -> Handle:
     """Opens a process by process ID."""
 
@@ -138,6 +224,7 @@ def open_process(process_id: int, access: int = DEFAULT_ACCESS) -> Handle:
 
 
 # https://stackoverflow.com/a/26271422
+@tracing.traced("winapi.process")
 def get_process_path(handle: Handle) -> str:
     """Returns the path of a process executable by handle."""
 
@@ -163,6 +250,7 @@ class ProcessCreationResult(NamedTuple):
     handle: Handle
 
 
+@tracing.traced("winapi.process")
 def create_process(path: str) -> ProcessCreationResult:
     """Creates a new process located at the given path."""
 
@@ -203,6 +291,7 @@ ModuleGenerator = Generator[ModuleInfo, None, None]
 MODULE_SIZE = 1024
 
 
+@tracing.traced("winapi.modules")
 def get_modules(handle: Handle, filter: FilterLike = lambda x: True) -> ModuleGenerator:
     """Generator giving the base address and size of each module in the given process
     based on a filter condition."""
@@ -250,12 +339,14 @@ def get_modules(handle: Handle, filter: FilterLike = lambda x: True) -> ModuleGe
         )
 
 
+@tracing.traced("winapi.memory")
 def read_memory(handle: Handle, address: int, size: int) -> bytes:
     """Reads memory from the given process at the given address."""
 
     buffer = (ctypes.c_char * size)()
 
     bytes_read = DWORD()
+    _MEMORY_READS.inc()
     if not win32.ReadProcessMemory(
         _make_raw_handle(handle),
         ctypes.c_void_p(address),
@@ -268,10 +359,34 @@ def read_memory(handle: Handle, address: int, size: int) -> bytes:
     return buffer.raw[: bytes_read.value]
 
 
+@tracing.traced("winapi.memory")
+def read_memory_into(handle: Handle, address: int, buffer: memoryview) -> int:
+    """Reads memory from the given process at the given address straight into
+    a writable buffer, returning the number of bytes read."""
+
+    size = len(buffer)
+    c_buffer = (ctypes.c_char * size).from_buffer(buffer)
+
+    bytes_read = DWORD()
+    _MEMORY_READS.inc()
+    if not win32.ReadProcessMemory(
+        _make_raw_handle(handle),
+        ctypes.c_void_p(address),
+        c_buffer,
+        size,
+        ctypes.byref(bytes_read),
+    ):
+        raise OSError(f"Failed to read memory: {get_os_error_fmt()}")
+
+    return bytes_read.value
+
+
+@tracing.traced("winapi.memory")
 def write_memory(handle: Handle, address: int, data: bytes) -> None:
     """Writes memory to the given process at the given address."""
 
     bytes_written = DWORD()
+    _MEMORY_WRITES.inc()
     if not win32.WriteProcessMemory(
         _make_raw_handle(handle),
         ctypes.c_void_p(address),
@@ -297,3 +412,23 @@ def get_main_refresh_rate() -> int:
 
     # Refresh rate is a DWORD at offset 120.
     return int.from_bytes(dev_mode[120:124], "little", signed=False)
+
+
+def get_pipe_bytes_available(fd: int) -> int | None:
+    """Returns how many bytes can be read from the pipe behind a file descriptor
+    without blocking, or `None` if it is not a pipe (or has been closed)."""
+
+    import msvcrt
+
+    available = DWORD()
+    if not win32.PeekNamedPipe(
+        msvcrt.get_osfhandle(fd),
+        None,
+        0,
+        None,
+        ctypes.byref(available),
+        None,
+    ):
+        return None
+
+    return available.value
@@ -3,16 +3,20 @@ from __future__ import annotations
 __all__ = (
     "PROCESS_VM_READ",
     "PROCESS_VM_WRITE",
+    "PROCESS_VM_OPERATION",
     "PROCESS_QUERY_INFORMATION",
     "SYNCHRONISE",
     "TH32CS_SNAPPROCESS",
     "MAX_PATH",
     "ENUM_CURRENT_SETTINGS",
+    "WAIT_TIMEOUT",
+    "WAIT_FAILED",
 )
 
 # Read Process Memory
 PROCESS_VM_READ = 0x0010
 PROCESS_VM_WRITE = 0x0020
+PROCESS_VM_OPERATION = 0x0008
 PROCESS_QUERY_INFORMATION = 0x0400
 SYNCHRONISE = 0x00100000
 
@@ -22,5 +26,9 @@ TH32CS_SNAPPROCESS = 0x00000002
 # Enum display settings (https://www.pinvoke.net/default.aspx/user32/enumdisplaysettings.html?diff=y)
 ENUM_CURRENT_SETTINGS = -1
 
+# Wait for single object
+WAIT_TIMEOUT = 0x00000102
+WAIT_FAILED = 0xFFFFFFFF
+
 # General Use
 MAX_PATH = 260